@@ -0,0 +1,155 @@
+"""Stand-ins for the Discord objects the hot paths touch.
+
+They carry only the attributes and methods the cogs use, and every API
+call is a no-op, so handlers can run without a connection.
+"""
+import datetime
+import itertools
+
+import discord
+
+from utils.trust import TrustClassifier
+
+
+ids = itertools.count(10 ** 17)
+
+
+class FakeRole:
+    def __init__(self, name: str):
+        self.id = next(ids)
+        self.name = name
+
+
+class FakeGuild:
+    def __init__(self):
+        self.id = next(ids)
+        self.channels = []
+        self.roles = []
+        self.me = FakeMember(self, permissions=discord.Permissions.none())
+
+
+class FakeMember:
+    def __init__(
+        self,
+        guild: FakeGuild,
+        roles: list = (),
+        permissions: discord.Permissions = None
+    ):
+        self.id = next(ids)
+        self.guild = guild
+        self.roles = list(roles)
+        self.mention = f"<@{self.id}>"
+        self.guild_permissions = permissions or discord.Permissions.none()
+
+    def __str__(self):
+        return f"member{self.id}"
+
+    def get_role(self, role_id: int):
+        return discord.utils.get(self.roles, id=role_id)
+
+    async def kick(self, *, reason=None):
+        pass
+
+    async def timeout(self, duration, *, reason=None):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, guild: FakeGuild):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = f"channel{self.id}"
+        self.mention = f"<#{self.id}>"
+        guild.channels.append(self)
+
+    def get_partial_message(self, message_id: int):
+        return FakeMessage(self, None, "", id=message_id)
+
+    async def send(self, *args, **kwargs):
+        pass
+
+    async def delete_messages(self, messages):
+        pass
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        channel: FakeChannel,
+        author: FakeMember,
+        content: str,
+        *,
+        id: int = None,
+        created_at: datetime.datetime = None,
+        mentions: list = ()
+    ):
+        self.id = id or next(ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.clean_content = content
+        self.created_at = created_at or discord.utils.utcnow()
+        self.mentions = list(mentions)
+
+    def is_system(self):
+        return False
+
+    async def delete(self):
+        pass
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+
+    def is_done(self):
+        return bool(self.sent)
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(content)
+
+    async def defer(self, **kwargs):
+        self.sent.append(None)
+
+
+class FakeInteraction:
+    def __init__(self, client, user: FakeMember):
+        self.client = client
+        self.user = user
+        self.guild = user.guild
+        self.guild_id = user.guild.id
+        self.permissions = user.guild_permissions
+        self.response = FakeResponse()
+
+
+class FakeTree:
+    def add_command(self, command, **kwargs):
+        pass
+
+
+class FakeBot:
+    """Just enough of the bot for the tag and moderation cogs."""
+
+    def __init__(self):
+        self.user = FakeMember(FakeGuild())
+        self.owner = self.user
+        self.tree = FakeTree()
+        self.channels = {}
+        self.trust = TrustClassifier(self)
+
+    def add_listener(self, func, name: str = None):
+        pass
+
+    def is_ready(self):
+        return False
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    def add_channel(self, channel: FakeChannel):
+        self.channels[channel.id] = channel
+        return channel
+
+    async def publish(self, event: str, **data):
+        pass
@@ -0,0 +1,301 @@
+"""Measure the tag, autocomplete and repost hot paths with generated data.
+
+Everything runs offline against fake Discord objects, in a temporary
+directory so the real tag database is never touched. Run from the
+repository root with, for example:
+
+    python -m benchmarks.hot_paths --size 10000 --save baseline.json
+    python -m benchmarks.hot_paths --size 10000 --compare baseline.json
+
+Comparing exits with status 1 when a path's median or p99 latency got
+slower than the baseline by more than the threshold. Baselines depend on
+the machine, so keep them local rather than committing them.
+"""
+import statistics
+import argparse
+import datetime
+import tempfile
+import asyncio
+import pickle
+import random
+import string
+import json
+import time
+import sys
+import os
+
+from benchmarks.fakes import (
+    FakeBot, FakeChannel, FakeGuild, FakeInteraction, FakeMember,
+    FakeMessage, FakeRole)
+from cogs.moderation import Moderation
+from utils.trust import TRUSTED_ROLES
+from utils.namespaces import GLOBAL
+from cogs.tag import CommandsTag
+from utils.codes import CodeIndex
+from utils.sitemap import HOME_URL, NAMESPACE, SitemapParser
+
+
+def word(rng: random.Random, low: int = 3, high: int = 10):
+    length = rng.randint(low, high)
+    return "".join(rng.choices(string.ascii_lowercase, k=length))
+
+
+def sentence(rng: random.Random, words: int):
+    return " ".join(word(rng) for _ in range(words))
+
+
+def generate_tags(rng: random.Random, size: int):
+    """A tag database in the format of the tag store."""
+    db = {}
+    while len(db) < size:
+        name = "-".join(word(rng) for _ in range(rng.randint(1, 2)))
+        db[name] = {
+            "content": sentence(rng, rng.randint(10, 60)),
+            "aliases": [word(rng) for _ in range(rng.randint(0, 3))]}
+    return db
+
+
+def generate_codes(rng: random.Random, size: int):
+    """A code table in the format of the codes JSON."""
+    codes = {}
+    while len(codes) < size:
+        code = str(rng.randint(1, 10 ** rng.randint(1, 6)))
+        codes[rng.choice(("", "-")) + code] = {
+            "title": rng.choice(("", sentence(rng, 3))),
+            "desc": sentence(rng, rng.randint(5, 20)),
+            "url": rng.choice((
+                "", f"{HOME_URL}/articles/{code}-{word(rng)}"))}
+    return codes
+
+
+def generate_sitemap(rng: random.Random, size: int):
+    """Sitemap XML bytes listing generated article pages."""
+    urls = "".join(
+        f"<url><loc>{HOME_URL}/articles/{rng.randint(1, 10**9)}-"
+        f"{'-'.join(word(rng) for _ in range(rng.randint(2, 8)))}"
+        f"</loc><lastmod>2024-01-01</lastmod></url>"
+        for _ in range(size))
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<urlset xmlns="{NAMESPACE[1:-1]}">{urls}</urlset>').encode()
+
+
+def tag_queries(rng: random.Random, cog: CommandsTag, count: int):
+    """Messages that mention a few tags, codes or nothing known."""
+    names = [
+        name
+        for main_name, value in cog.namespaces.get(GLOBAL).db.items()
+        for name in [main_name] + value["aliases"]]
+    codes = list(cog.codes)
+
+    queries = []
+    for _ in range(count):
+        words = [word(rng) for _ in range(rng.randint(3, 40))]
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words)), rng.choice(names))
+        if codes and rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(codes))
+        queries.append(" ".join(words))
+    return queries
+
+
+def autocomplete_inputs(rng: random.Random, cog: CommandsTag, count: int):
+    """What users type while picking a tag, code or article."""
+    names = [
+        *cog.namespaces.get(GLOBAL).db, *cog.codes, *cog.articles]
+    inputs = []
+    for _ in range(count):
+        name = rng.choice(names)
+        start = rng.choice((0, 0, rng.randrange(len(name))))
+        inputs.append(name[start:start + rng.randint(1, 8)])
+    return inputs
+
+
+def repost_messages(rng: random.Random, count: int, authors: int):
+    """Messages from many authors, some of them repeated or pasted logs."""
+    guild = FakeGuild()
+    channels = [FakeChannel(guild) for _ in range(3)]
+    trusted = FakeRole(TRUSTED_ROLES[0])
+    guild.roles.append(trusted)
+    members = [
+        FakeMember(guild, roles=[trusted] if rng.random() < 0.05 else [])
+        for _ in range(authors)]
+
+    start = datetime.datetime.now(datetime.timezone.utc)
+    last_content = {}
+    messages = []
+
+    for i in range(count):
+        author = rng.choice(members)
+        roll = rng.random()
+        if roll < 0.2 and author.id in last_content:
+            content = last_content[author.id]
+        elif roll < 0.3:
+            content = "\n".join(sentence(rng, 12) for _ in range(20))
+        else:
+            content = sentence(rng, rng.randint(2, 30))
+
+        last_content[author.id] = content
+        messages.append(FakeMessage(
+            rng.choice(channels), author, content,
+            created_at=start + datetime.timedelta(seconds=i)))
+
+    return channels, messages
+
+
+def measure(function, inputs):
+    timings = []
+    for value in inputs:
+        start = time.perf_counter()
+        function(value)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def measure_async(function, inputs):
+    timings = []
+    for value in inputs:
+        start = time.perf_counter()
+        await function(value)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarise(timings: list):
+    timings = sorted(timings)
+    return {
+        "ops_per_second": len(timings) / sum(timings),
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        * 1e6}
+
+
+async def build_tag_cog(rng: random.Random, size: int):
+    """A tag cog loaded with generated tags, codes and articles."""
+    with open("db.p", "wb") as file:
+        pickle.dump(generate_tags(rng, size), file)
+
+    cog = CommandsTag(FakeBot())
+    cog.auto_db_save.cancel()
+    cog.auto_fetch_codes_and_sitemap.cancel()
+
+    codes = generate_codes(rng, size)
+    cog.update_codes(codes, CodeIndex(codes))
+
+    parser = SitemapParser()
+    parser.feed(generate_sitemap(rng, size))
+    cog.update_articles(parser.close())
+    return cog
+
+
+async def run(size: int, count: int, seed: int):
+    rng = random.Random(seed)
+    results = {}
+
+    cog = await build_tag_cog(rng, size)
+    queries = tag_queries(rng, cog, count)
+    inputs = autocomplete_inputs(rng, cog, count)
+
+    results["get_custom_tag_responses"] = measure(
+        cog.get_custom_tag_responses, queries)
+    results["get_code_responses"] = measure(cog.get_code_responses, queries)
+    namespaces = cog.namespaces.chain(GLOBAL)
+    results["autocomplete_base"] = measure(
+        lambda current: cog.autocomplete_base(current, namespaces), inputs)
+    results["autocomplete_base (tags only)"] = measure(
+        lambda current: cog.autocomplete_base(
+            current, namespaces, custom_tags_only=True),
+        inputs)
+
+    user = FakeMember(FakeGuild())
+    articles = list(cog.articles)
+    tag_inputs = [
+        (FakeInteraction(cog.bot, user),
+         rng.choice(articles) if rng.random() < 0.2 else query)
+        for query in queries]
+    results["tag_base"] = await measure_async(
+        lambda item: cog.tag_base(*item, None), tag_inputs)
+
+    await cog.cog_unload()
+
+    bot = FakeBot()
+    moderation = Moderation(bot)
+    moderation.tracking_since = (
+        datetime.datetime.now(datetime.timezone.utc)
+        - datetime.timedelta(days=1))
+    channels, messages = repost_messages(rng, count, max(1, count // 20))
+    for channel in channels:
+        bot.add_channel(channel)
+
+    results["handle_repost"] = await measure_async(
+        moderation.on_message, messages)
+    await moderation.actions.close(timeout=0)
+
+    return {name: summarise(timings) for name, timings in results.items()}
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Names of the paths that got slower than the baseline allows."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for key in ("p50_us", "p99_us"):
+            if result[key] > baseline[name][key] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {key} {baseline[name][key]:.1f} -> "
+                    f"{result[key]:.1f}")
+    return regressions
+
+
+def main(arguments: argparse.Namespace):
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results = asyncio.run(
+                run(arguments.size, arguments.queries, arguments.seed))
+        finally:
+            os.chdir(cwd)
+
+    print(f"{arguments.size} entries, {arguments.queries} calls per path")
+    print(f"{'path':<30} {'ops/s':>10} {'mean us':>9} {'p50 us':>9}"
+          f" {'p99 us':>9}")
+    for name, result in results.items():
+        print(f"{name:<30} {result['ops_per_second']:>10.0f}"
+              f" {result['mean_us']:>9.1f} {result['p50_us']:>9.1f}"
+              f" {result['p99_us']:>9.1f}")
+
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if baseline is None:
+        return True
+
+    regressions = compare(results, baseline, arguments.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size", type=int, default=10_000,
+                        help="tags, codes and articles to generate (each)")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="calls measured for each path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="FILE",
+                        help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="flag paths slower than this baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown before flagging (0.25 = 25%%)")
+    sys.exit(not main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""Compare repost similarity checks against a plain SequenceMatcher.
+
+Run with `python -m benchmarks.similarity` from the repository root.
+"""
+from difflib import SequenceMatcher
+import statistics
+import random
+import string
+import time
+import sys
+
+from utils.similarity import SimilarityEngine
+
+
+def log_line(rng: random.Random):
+    level = rng.choice(("INFO", "WARN", "ERROR", "DEBUG"))
+    words = " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(rng.randint(4, 12)))
+    return f"[{rng.randint(0, 99999):05}] {level} {words}"
+
+
+def pasted_log(rng: random.Random, length: int = 1900):
+    lines = []
+    while sum(map(len, lines)) < length:
+        lines.append(log_line(rng))
+    return "\n".join(lines)[:length]
+
+
+def edited(rng: random.Random, text: str, edits: int):
+    characters = list(text)
+    for _ in range(edits):
+        index = rng.randrange(len(characters))
+        characters[index] = rng.choice(string.ascii_letters)
+    return "".join(characters)
+
+
+def generate_pairs(count: int, seed: int = 0):
+    """Make (previous, current) message pairs for each kind of workload."""
+    rng = random.Random(seed)
+    makers = {
+        "chat lines": lambda: (log_line(rng), log_line(rng)),
+        "pasted logs": lambda: (pasted_log(rng), pasted_log(rng)),
+        "log then line": lambda: (pasted_log(rng), log_line(rng)),
+        "edited repost": lambda: edited_pair(rng),
+    }
+
+    return {
+        name: [make() for _ in range(count)]
+        for name, make in makers.items()}
+
+
+def edited_pair(rng: random.Random):
+    log = pasted_log(rng)
+    return log, edited(rng, log, rng.randint(0, 200))
+
+
+def measure(pairs, decide):
+    timings, decisions = [], []
+    for previous, current in pairs:
+        start = time.perf_counter()
+        decisions.append(decide(current, previous))
+        timings.append(time.perf_counter() - start)
+    return timings, decisions
+
+
+def summary(timings):
+    timings = sorted(timings)
+    p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+    return f"{statistics.fmean(timings) * 1e6:8.1f} {p99 * 1e6:8.1f}"
+
+
+def main(count: int = 200):
+    engine = SimilarityEngine(threshold=0.9)
+    mismatches = 0
+
+    print(f"{'workload':<14} {'SequenceMatcher':>17}  {'SimilarityEngine':>17}"
+          f"  (mean/p99 us per message)")
+
+    for name, pairs in generate_pairs(count).items():
+        baseline, expected = measure(
+            pairs, lambda a, b: SequenceMatcher(None, a, b).ratio() > 0.9)
+        # Moderation keeps only the previous message's text, so both are
+        # fingerprinted afresh for each comparison
+        filtered, decisions = measure(pairs, engine.is_similar)
+        mismatches += sum(a != b for a, b in zip(expected, decisions))
+
+        print(f"{name:<14} {summary(baseline)}  {summary(filtered)}")
+
+    print(f"{mismatches} decisions differ from SequenceMatcher")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    sys.exit(not main(*map(int, sys.argv[1:])))
@@ -1,38 +1,251 @@
+import argparse
+import asyncio
 import logging
+import time
+import os
 
 from discord.ext import commands
 import discord
 
-from token_ import token
+from utils.snapshot import load_snapshot, save_snapshot
+from utils.coordinator import CoordinatorClient
+from utils.logs import setup_logging
+from utils.metrics import Metrics
+from utils.trust import TrustClassifier
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)-8s %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S")
-
-for logger in logging.root.manager.loggerDict:
-    logging.getLogger(logger).setLevel(logging.WARNING)
+MAX_MESSAGES = 1000
+MEMBER_CACHE = "default"
+CHUNK_GUILDS_AT_STARTUP = False
+HANDOFF_PATH = "handoff{}.p"
+HANDOFF_MAX_AGE = 60  # seconds, older ones are left over from a crash
 
 
 class GolemBot(commands.Bot):
-    def __init__(self):
+    def __init__(
+        self,
+        *,
+        coordinator_port: int = None,
+        memory_profile: float = None,
+        metrics_port: int = None,
+        record_path: str = None,
+        **options
+    ):
         intents = discord.Intents(
-            guilds=True, messages=True, message_content=True)
+            guilds=True,
+            messages=True,
+            message_content=True,
+            moderation=True)
 
         super().__init__(
             command_prefix=[],
             allowed_mentions=discord.AllowedMentions.none(),
-            intents=intents)
+            intents=intents,
+            enable_debug_events=bool(record_path),
+            **options)
+
+        self.memory_profile = memory_profile
+        self.cog_states = {}  # exported by unloaded cogs, for the next ones
+        self.owner = None  # set in setup_hook, from the application info
+        self.trust = TrustClassifier(self)
+        self.created = time.perf_counter()
+        self.startup_times = {}
+        self.record_path = record_path
+        self.coordinator = None
+        if coordinator_port:
+            self.coordinator = CoordinatorClient(self, coordinator_port)
+
+        self.metrics = None
+        if metrics_port:
+            self.metrics = Metrics(self, metrics_port)
+
+        # Worker processes of launcher.py restart at the same time
+        shard_ids = getattr(self, "shard_ids", None)
+        self.handoff_path = HANDOFF_PATH.format(
+            f"-{shard_ids[0]}" if shard_ids else "")
 
     async def setup_hook(self):
-        self.owner = (await self.application_info()).owner
+        started = time.perf_counter()
         self.cog_file_names = ("tag", "logging", "moderation", "owner")
 
-        for cog in self.cog_file_names:
-            await self.load_extension(f"cogs.{cog}")
+        if self.memory_profile:
+            self.cog_file_names += ("memory",)
+        if self.record_path:
+            self.cog_file_names += ("recorder",)
+
+        if self.coordinator:
+            await self.coordinator.start()
+
+        if self.metrics:
+            await self.metrics.start()
+
+        self.read_handoff()
+
+        # Cogs only wait on disk and their own caches, none of them on each
+        # other or on the application info, so it's all fetched at once
+        self.startup_times["services"] = time.perf_counter() - started
+        app_info, *_ = await asyncio.gather(
+            self.timed("application_info", self.application_info()),
+            *(
+                self.timed(f"cogs.{cog}", self.load_extension(f"cogs.{cog}"))
+                for cog in self.cog_file_names))
+        self.owner = app_info.owner
+        self.startup_times["setup_hook"] = time.perf_counter() - started
+
+        logging.info("Setup took %s", ", ".join(
+            f"{name} {seconds * 1000:.0f} ms"
+            for name, seconds in self.startup_times.items()))
+
+    async def timed(self, name: str, coroutine):
+        """Await a startup step, noting down how long it took."""
+        started = time.perf_counter()
+        try:
+            return await coroutine
+        finally:
+            self.startup_times[name] = time.perf_counter() - started
+
+    async def add_cog(self, cog: commands.Cog, **kwargs):
+        state = self.cog_states.pop(cog.qualified_name, None)
+        if state is not None:
+            try:
+                cog.import_state(state)
+            except Exception:
+                logging.exception(
+                    "Couldn't import state of %s", cog.qualified_name)
+
+        if not self.metrics:
+            return await super().add_cog(cog, **kwargs)
+
+        self.metrics.instrument_cog(cog)
+        await super().add_cog(cog, **kwargs)
+        self.metrics.instrument_commands()
+
+    async def remove_cog(self, name: str, **kwargs):
+        """Remove a cog, keeping its state for the cog that replaces it.
+
+        The state is exported once the cog stopped listening to events and
+        finished unloading, so nothing it handled in between goes missing.
+        """
+        cog = await super().remove_cog(name, **kwargs)
+        if cog is not None and hasattr(cog, "export_state"):
+            self.cog_states[cog.qualified_name] = cog.export_state()
+        return cog
+
+    def write_handoff(self):
+        """Save the state of unloaded cogs for the process replacing this."""
+        try:
+            save_snapshot(self.handoff_path, {
+                "written": time.time(), "cogs": self.cog_states})
+        except Exception:
+            logging.exception("Couldn't write %s", self.handoff_path)
+
+    def read_handoff(self):
+        """Take over the cog states left by the process this replaced."""
+        handoff = load_snapshot(self.handoff_path)
+        if not handoff:
+            return
+
+        os.remove(self.handoff_path)
+        if time.time() - handoff["written"] > HANDOFF_MAX_AGE:
+            logging.warning("Ignoring outdated %s", self.handoff_path)
+            return
+
+        self.cog_states.update(handoff["cogs"])
+        logging.info(
+            "Took over the state of %s", ", ".join(handoff["cogs"]) or "-")
+
+    async def publish(self, event: str, **data):
+        """Tell the other worker processes about an event, if there are any."""
+        if self.coordinator:
+            await self.coordinator.publish(event, **data)
+
+    async def close(self):
+        if self.coordinator:
+            await self.coordinator.close()
+        if self.metrics:
+            await self.metrics.close()
+        await super().close()
+
+
+class ShardedGolemBot(GolemBot, commands.AutoShardedBot):
+    """Golem running several gateway shards in this process."""
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Run the Golem bot.")
+    parser.add_argument(
+        "--sharded", action="store_true",
+        help="use multiple gateway shards (recommended count by default)")
+    parser.add_argument(
+        "--shard-count", type=int,
+        help="total shard count across every process")
+    parser.add_argument(
+        "--shard-ids", type=lambda ids: [int(i) for i in ids.split(",")],
+        help="comma separated shards to run in this process")
+    parser.add_argument(
+        "--coordinator", type=int, metavar="PORT",
+        help="port of the local coordinator, when run by launcher.py")
+    parser.add_argument(
+        "--max-messages", type=int, default=MAX_MESSAGES,
+        help="messages kept in the gateway cache, 0 to disable it")
+    parser.add_argument(
+        "--member-cache", choices=("default", "none"), default=MEMBER_CACHE,
+        help="which members are kept in the gateway cache")
+    parser.add_argument(
+        "--chunk-guilds", action="store_true",
+        default=CHUNK_GUILDS_AT_STARTUP,
+        help="request every guild's members at startup")
+    parser.add_argument(
+        "--memory-profile", type=float, metavar="MINUTES",
+        help="log memory use by component every few minutes")
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT",
+        help="time handlers and serve the results on localhost:PORT/metrics "
+             "(offset by the first shard ID when using --shard-ids)")
+    parser.add_argument(
+        "--record", metavar="FILE",
+        help="record anonymised gateway events, to replay with replay.py")
+    parser.add_argument(
+        "--log-json", action="store_true",
+        help="write logs as JSON lines with structured fields")
+    parser.add_argument(
+        "--log-sample", action="append", default=[],
+        type=lambda rate: (rate.split("=")[0], int(rate.split("=")[1])),
+        metavar="CATEGORY=N",
+        help="only log one in N records of a category, e.g. interaction=10")
+    return parser.parse_args(arguments)
+
+
+def create_bot(arguments: argparse.Namespace):
+    options = {
+        "coordinator_port": arguments.coordinator,
+        "memory_profile": arguments.memory_profile,
+        "metrics_port": arguments.metrics_port,
+        "record_path": arguments.record,
+        "max_messages": arguments.max_messages or None,
+        "chunk_guilds_at_startup": arguments.chunk_guilds}
+
+    if arguments.member_cache == "none":
+        options["member_cache_flags"] = discord.MemberCacheFlags.none()
+
+    if arguments.metrics_port and arguments.shard_ids:
+        options["metrics_port"] += arguments.shard_ids[0]
+
+    if not arguments.sharded:
+        return GolemBot(**options)
+
+    return ShardedGolemBot(
+        shard_count=arguments.shard_count,
+        shard_ids=arguments.shard_ids,
+        **options)
 
 
 if __name__ == "__main__":
-    bot = GolemBot()
-    bot.run(token)
+    from token_ import token
+
+    arguments = parse_arguments()
+    setup_logging(
+        json_lines=arguments.log_json, sampling=dict(arguments.log_sample))
+
+    bot = create_bot(arguments)
+    bot.run(token, log_handler=None)
@@ -1,11 +1,16 @@
-import traceback
+import datetime
 import logging
+import time
 
 from discord.app_commands import AppCommandError
 from discord import app_commands, Interaction
-from discord.ext import commands
+from discord.ext import commands, tasks
 import discord
 
+from utils.errors import ErrorDigests
+
+ERROR_DIGEST_WINDOW = datetime.timedelta(minutes=30)
+
 
 class Logging(commands.Cog):
     """Print bot events on terminal, and announce errors to user and owner."""
@@ -13,6 +18,8 @@ class Logging(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.bot.tree.on_error = self.on_app_command_error
+        self.errors = ErrorDigests(ERROR_DIGEST_WINDOW)
+        self.send_error_digests.start()
 
     async def send_error(self, itx: Interaction, content):
         """Send error message in the right way (using followup if needed)."""
@@ -21,10 +28,26 @@ class Logging(commands.Cog):
         else:
             await itx.response.send_message(content, ephemeral=True)
 
+    @staticmethod
+    def location(itx: Interaction):
+        return f"{itx.guild.name}/#{itx.channel}" if itx.guild else "DM"
+
+    @staticmethod
+    def fields(itx: Interaction, **fields):
+        """Structured fields for JSON logs, passed with `extra`."""
+        return {
+            "guild_id": itx.guild_id,
+            "channel_id": itx.channel_id,
+            "user_id": itx.user.id,
+            "command": itx.command.qualified_name if itx.command else None,
+            **fields}
+
     @commands.Cog.listener()
     async def on_ready(self):
         """Log successful bot startup."""
-        logging.info(f"Logged in as {self.bot.user}!")
+        logging.info(
+            "Logged in as %s! (%.1f s after start)",
+            self.bot.user, time.perf_counter() - self.bot.created)
 
     @commands.Cog.listener()
     async def on_interaction(self, itx: Interaction):
@@ -32,8 +55,10 @@ class Logging(commands.Cog):
         if itx.type != discord.InteractionType.application_command:
             return
 
-        location = f"{itx.guild.name}/#{itx.channel}" if itx.guild else "DM"
-        logging.info(f"{itx.user} ({location}): {itx.command.name}")
+        logging.info(
+            "%s (%s): %s", itx.user, self.location(itx), itx.command.name,
+            extra=self.fields(itx, category="interaction", latency=(
+                discord.utils.utcnow() - itx.created_at).total_seconds()))
 
     async def on_app_command_error(self, itx: Interaction, e: AppCommandError):
         """Error handling for slash commands."""
@@ -43,10 +68,10 @@ class Logging(commands.Cog):
         else:
             logged = type(e).__name__
 
-        location = f"{itx.guild.name}/#{itx.channel}" if itx.guild else "DM"
-
         logging.error(
-            f"{itx.user} ({location}): {itx.command.name} [{logged}]")
+            "%s (%s): %s [%s]",
+            itx.user, self.location(itx), itx.command.name, logged,
+            extra=self.fields(itx, category="command_error", error=logged))
 
         if isinstance(e, app_commands.BotMissingPermissions):
             perms = "`, `".join(e.missing_permissions)
@@ -62,12 +87,32 @@ class Logging(commands.Cog):
             return await self.send_error(itx, e)
 
         await self.send_error(itx, f"some unexpected error happened: `{e}`")
-        await self.bot.owner.send(
-            f"{itx.user} ({location}): {itx.command.name} [{logged}]\n"
-            f"```py\n{''.join(traceback.format_exception(e))}```")
+        self.errors.add(
+            e, itx.command.qualified_name,
+            itx.guild.name if itx.guild else "DM")
 
         raise e
 
+    @tasks.loop(seconds=30)
+    async def send_error_digests(self):
+        """Tell the owner about new errors, and about repeats once in a while.
+
+        Reporting from here rather than from the failed interaction keeps an
+        outage from turning into one DM per error.
+        """
+        for report in self.errors.pop_reports():
+            try:
+                await self.bot.owner.send(report)
+            except discord.HTTPException as e:
+                logging.warning("Couldn't send error digest [%s]", e)
+
+    @send_error_digests.before_loop
+    async def before_send_error_digests(self):
+        await self.bot.wait_until_ready()
+
+    async def cog_unload(self):
+        self.send_error_digests.cancel()
+
 
 async def setup(bot):
     await bot.add_cog(Logging(bot))
@@ -0,0 +1,95 @@
+import tracemalloc
+import logging
+
+from discord.ext import commands, tasks
+import discord
+
+from cogs.moderation import DELETION_WINDOW
+from utils.memory import deep_sizeof
+
+
+class MemoryProfile(commands.Cog):
+    """Periodically log where memory goes, to size the gateway caches."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.snapshot = None
+
+        # Tracing started elsewhere, such as by PYTHONTRACEMALLOC, is left on
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+        self.report.change_interval(minutes=bot.memory_profile)
+        self.report.start()
+
+    def component_sizes(self):
+        """Approximate bytes used by each of the bot's larger structures."""
+        messages = self.bot._connection._messages
+        sizes = {"message cache": deep_sizeof(messages)}
+
+        if moderation := self.bot.get_cog("Moderation"):
+            sizes["moderation state"] = moderation.stats()["state_bytes"]
+
+        if tag := self.bot.get_cog("CommandsTag"):
+            sizes["tag db"] = sum(
+                deep_sizeof(namespace.db) for namespace in tag.namespaces)
+            sizes["codes"] = deep_sizeof(tag.codes)
+            sizes["articles"] = deep_sizeof(tag.articles)
+
+        return sizes
+
+    def message_cache_coverage(self):
+        """Describe how far back the message cache reaches."""
+        messages = self.bot._connection._messages
+        if messages is None:
+            return "message cache is disabled"
+        if not messages:
+            return "message cache is empty"
+
+        now = discord.utils.utcnow()
+        oldest = now - messages[0].created_at
+        in_window = sum(
+            now - m.created_at <= DELETION_WINDOW for m in messages)
+
+        coverage = (
+            f"{len(messages)}/{messages.maxlen} messages cached, "
+            f"oldest from {oldest.total_seconds() / 60:.1f} min ago, "
+            f"{in_window} within the deletion window")
+
+        if moderation := self.bot.get_cog("Moderation"):
+            coverage += (
+                f", {len(moderation.recent_messages)} kept by moderation "
+                f"for deletion checks")
+
+        return coverage
+
+    @tasks.loop(minutes=10)
+    async def report(self):
+        """Log component sizes and the biggest allocation changes."""
+        snapshot = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+
+        lines = [
+            f"Memory profile: {traced / 2**20:.1f} MiB traced "
+            f"(peak {peak / 2**20:.1f} MiB)",
+            self.message_cache_coverage()]
+
+        for name, size in self.component_sizes().items():
+            lines.append(f"{name}: {size / 2**10:.1f} KiB")
+
+        if self.snapshot:
+            top = snapshot.compare_to(self.snapshot, "filename")[:5]
+            lines.extend(f"  {stat}" for stat in top)
+
+        self.snapshot = snapshot
+        logging.info("\n".join(lines))
+
+    async def cog_unload(self):
+        self.report.cancel()
+        if self.started_tracing:
+            tracemalloc.stop()
+
+
+async def setup(bot):
+    await bot.add_cog(MemoryProfile(bot))
@@ -1,12 +1,24 @@
-from difflib import SequenceMatcher
 import datetime
 import logging
 
 from discord.ext import commands
 import discord
 
+from utils.history import (
+    ExpiringStore, MessageRecord, RecentMessage, RecentMessages)
+from utils.actions import ActionQueue
+from utils.audit_log import AuditLogCache
+from utils.similarity import SimilarityEngine
+
 NOTIFICATIONS_CHANNEL = "safety-notifications"
-TRUSTED_ROLES = ("Hero", "Jedi", "Parsec Team")
+REPOST_WINDOW = datetime.timedelta(minutes=20)
+AUDIT_LOG_WINDOW = datetime.timedelta(minutes=2)
+DELETION_WINDOW = datetime.timedelta(minutes=5)
+WARNING_WINDOW = datetime.timedelta(days=1)
+MAX_TRACKED_AUTHORS = 10_000
+MAX_TRACKED_DELETIONS = 50_000
+RECENT_MESSAGES_PER_CHANNEL = 100
+MAX_RECENT_CHANNELS = 2_000
 
 
 class Moderation(commands.Cog):
@@ -14,143 +26,249 @@ class Moderation(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.previous_message = {}
-        self.warned_previously = set()
+        self.previous_message = ExpiringStore(
+            MAX_TRACKED_AUTHORS, REPOST_WINDOW)
+        self.warned_previously = ExpiringStore(
+            MAX_TRACKED_AUTHORS, WARNING_WINDOW)
+        self.deleted_messages = ExpiringStore(
+            MAX_TRACKED_DELETIONS, REPOST_WINDOW)
+        self.recent_messages = RecentMessages(
+            RECENT_MESSAGES_PER_CHANNEL, MAX_RECENT_CHANNELS, DELETION_WINDOW)
+        self.tracking_since = None
+        if bot.is_ready():
+            self.tracking_since = discord.utils.utcnow()
+        self.audit_log = AuditLogCache(AUDIT_LOG_WINDOW)
+        self.actions = ActionQueue()
+        self.similarity = SimilarityEngine(threshold=0.9)
 
-    def is_trusted_member(self, member: discord.Member):
-        return (
-            member == self.bot.user
-            or any([role.name in TRUSTED_ROLES for role in member.roles]))
+    def stats(self):
+        """Size of the per-author moderation state and the action queue."""
+        return {
+            "tracked_authors": len(self.previous_message),
+            "warned_authors": len(self.warned_previously),
+            "tracked_deletions": len(self.deleted_messages),
+            "recent_messages": len(self.recent_messages),
+            "state_bytes": (
+                self.previous_message.memory_usage()
+                + self.warned_previously.memory_usage()
+                + self.deleted_messages.memory_usage()
+                + self.recent_messages.memory_usage()),
+            **{
+                f"action_{key}": value
+                for key, value in self.actions.stats().items()}}
+
+    def export_state(self):
+        """Repost, warning and deletion history, to survive a restart."""
+        return {
+            "previous_message": self.previous_message.dump(),
+            "warned_previously": self.warned_previously.dump(),
+            "deleted_messages": self.deleted_messages.dump(),
+            "recent_messages": self.recent_messages.dump(),
+            "tracking_since": self.tracking_since,
+            "audit_log": self.audit_log.dump()}
 
-    async def is_deleted_message_in_audit_log(self, message: discord.Message):
+    def import_state(self, state: dict):
+        self.previous_message.restore(state["previous_message"])
+        self.warned_previously.restore(state["warned_previously"])
+        self.deleted_messages.restore(state["deleted_messages"])
+        self.recent_messages.restore(state.get("recent_messages", []))
+
+        # Within the same gateway session (a reload rather than a restart),
+        # deletions and audit log entries were tracked without gaps
+        if self.bot.is_ready() and state["tracking_since"]:
+            self.tracking_since = state["tracking_since"]
+            self.audit_log.restore(state["audit_log"])
+
+    async def is_deleted_message_in_audit_log(
+        self, guild: discord.Guild, record: RecentMessage
+    ):
         """Whether a message is deleted due to moderation action."""
-        if not message.guild.me.guild_permissions.view_audit_log:
+        if not guild.me.guild_permissions.view_audit_log:
             return False
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        two_minutes_ago = now - datetime.timedelta(minutes=2)
-        actions = (
-            discord.AuditLogAction.ban,             # ban auto bulk deletion
-            discord.AuditLogAction.message_delete,  # human moderator action
-            discord.AuditLogAction.kick,            # bot action
-            discord.AuditLogAction.member_update)   # bot action (timeout)
-
-        async for entry in message.guild.audit_logs(after=two_minutes_ago):
-            if entry.action in actions and entry.target == message.author:
-                return True
-        return False
-
-    async def soft_warn(
+        return await self.audit_log.contains(guild, record.author_id)
+
+    async def still_exists(self, record: MessageRecord):
+        """Whether a previously seen message wasn't deleted since.
+
+        Deletions are tracked from gateway events, so the API only needs to
+        be asked about messages sent before the current session started.
+        """
+        if record.id in self.deleted_messages:
+            return False
+        if self.tracking_since and record.created_at >= self.tracking_since:
+            return True
+
+        channel = self.bot.get_channel(record.channel_id)
+        if not channel:
+            return False
+
+        try:
+            return bool(await channel.fetch_message(record.id))
+        except discord.NotFound:
+            return False
+
+    def soft_warn(
         self, author: discord.Member, channel: discord.TextChannel, reason: str
     ):
         """Give one warning and timeout, or kick if warned previously."""
-        if author in self.warned_previously:
-            await author.kick(reason=reason)
+        key = (author.guild.id, author.id)
+
+        if key in self.warned_previously:
+            self.actions.kick(author, reason)
         else:
-            await author.timeout(
-                datetime.timedelta(minutes=1), reason=reason)
-            await channel.send(
-                reason,
-                allowed_mentions=discord.AllowedMentions(users=[author]),
-                delete_after=20)
-            self.warned_previously.add(author)
+            self.actions.timeout(author, datetime.timedelta(minutes=1), reason)
+            self.actions.warn(channel, author, reason, delete_after=20)
+            self.warned_previously.set(key)
 
         # Allow user to post once next time rather than consider a duplicate
-        self.previous_message.pop(author, None)
+        self.previous_message.pop(key)
 
     async def handle_repost(self, message: discord.Message):
         """Detect and deal with reposts as is appropriate."""
-        previous = self.previous_message.get(message.author.id)
-        twenty_minutes = datetime.timedelta(minutes=20)
+        key = (message.guild.id, message.author.id)
+        previous = self.previous_message.get(key)
 
         is_reposted_message = (
             previous
-            and SequenceMatcher(
-                None, message.content, previous.content).ratio() > 0.9
-            and message.created_at - previous.created_at < twenty_minutes
-            and await previous.channel.fetch_message(previous.id))
+            and message.created_at - previous.created_at < REPOST_WINDOW
+            and self.similarity.is_similar(message.content, previous.content)
+            and await self.still_exists(previous))
 
         if not is_reposted_message:
-            self.previous_message[message.author.id] = message
+            self.previous_message.set(key, MessageRecord(message))
             return
 
-        if previous.channel != message.channel:
+        if previous.channel_id != message.channel.id:
             reason = (
-                f"{message.author.mention} don't post the same message "
-                "in two channels. Read <#380811257973833738> to find where "
-                "your message should be posted")
+                "don't post the same message in two channels. Read "
+                "<#380811257973833738> to find where your message should be "
+                "posted")
         else:
             reason = (
-                f"{message.author.mention} don't post the same message "
-                "twice in a short period of time")
+                "don't post the same message twice in a short period of time")
+
+        self.soft_warn(message.author, message.channel, reason)
+        self.actions.delete(message)
 
-        await self.soft_warn(message.author, message.channel, reason)
-        await message.delete()
-        await previous.delete()
+        # A deleted channel took the message with it, and one that's only
+        # out of the cache can't be bulk deleted from, so it's left alone
+        if previous_channel := self.bot.get_channel(previous.channel_id):
+            self.actions.delete(
+                previous_channel.get_partial_message(previous.id))
 
-        self.previous_message.pop(message.author.id)
+        self.previous_message.pop(key)
 
     async def report_suspicious_message(
-        self, message: discord.Message, targeted_member: discord.Member
+        self, record: RecentMessage, channel: discord.TextChannel
     ):
         """Log and warn about deleted message."""
+        targeted_id = record.mention_ids[0]
         logging.info(
-            f"Suspicious message by {message.author}: {message.content}")
+            "Suspicious message by %s: %s", record.author_id, record.content,
+            extra={
+                "category": "suspicious_message",
+                "guild_id": channel.guild.id,
+                "channel_id": channel.id,
+                "user_id": record.author_id,
+                "target_id": targeted_id})
 
-        await message.channel.send(
-            f"{targeted_member.mention} if you have been directed by a user "
+        await channel.send(
+            f"<@{targeted_id}> if you have been directed by a user "
             f"to get help elsewhere, you may be getting tricked. "
             f"We will never ask you to create a ticket on a different "
             f"Discord server (this is the only official server), and our "
             f"official site is <https://parsec.app>.",
-            allowed_mentions=discord.AllowedMentions(users=[targeted_member]))
+            allowed_mentions=discord.AllowedMentions(
+                users=[discord.Object(targeted_id)]))
 
-        channel = discord.utils.get(
-            message.guild.channels, name=NOTIFICATIONS_CHANNEL)
+        notifications = discord.utils.get(
+            channel.guild.channels, name=NOTIFICATIONS_CHANNEL)
 
-        if not channel:
+        if not notifications:
             return
 
-        content_in_quotes = "> " + message.content.replace("\n", "\n> ")
+        content_in_quotes = "> " + record.content.replace("\n", "\n> ")
+        created_at = discord.utils.format_dt(record.created_at, style='t')
 
-        await channel.send(
-            f"{message.author.mention}'s message "
-            f"from {discord.utils.format_dt(message.created_at, style='t')} "
-            f"was deleted in {message.channel.mention}:"
+        await notifications.send(
+            f"<@{record.author_id}>'s message from {created_at} "
+            f"was deleted in {channel.mention}:"
             f"\n{content_in_quotes or '> (empty)'}",
             suppress_embeds=True)
 
+    @commands.Cog.listener("on_shard_ready")
+    @commands.Cog.listener()
+    async def on_ready(self, shard_id: int = None):
+        """Only trust locally tracked events from this session on."""
+        self.tracking_since = discord.utils.utcnow()
+        self.audit_log.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.audit_log.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
+        self.audit_log.add(entry)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.deleted_messages.set(payload.message_id)
+
+        if record := self.recent_messages.pop(payload.message_id):
+            await self.check_deleted_message(record)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.deleted_messages.set(message_id)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """Pass each message to the repost handler."""
-        if self.is_trusted_member(message.author):
+        if not message.guild:
+            return
+        if self.bot.trust.is_trusted(message.author):
             return
         if message.is_system():
             return
 
+        if self.could_be_suspicious(message):
+            self.recent_messages.add(RecentMessage(message))
+
         await self.handle_repost(message)
 
-    @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
+    def could_be_suspicious(self, message: discord.Message):
+        """Whether deleting the message soon would need a closer look.
+
+        Only these are kept for `check_deleted_message`, which doesn't need
+        the message to still be in the gateway message cache.
+        """
+        return (
+            len(message.mentions) == 1
+            and not self.bot.trust.is_trusted(message.mentions[0]))
+
+    async def check_deleted_message(self, record: RecentMessage):
         """Check whether message deletion is suspicious.
 
         Message deletions that are quick and mention one user may be
         attempting to trick said user into getting help via fake tickets.
         """
         now = datetime.datetime.now(datetime.timezone.utc)
-        five_minutes = datetime.timedelta(minutes=5)
-        targeted_member = message.mentions[0] if message.mentions else None
+        channel = self.bot.get_channel(record.channel_id)
 
         is_considered_normal = (
-            self.is_trusted_member(message.author)
-            or message.is_system()
-            or await self.is_deleted_message_in_audit_log(message)
-            or now - message.created_at > five_minutes
-            or len(message.mentions) != 1
-            or self.is_trusted_member(targeted_member))
+            not channel
+            or now - record.created_at > DELETION_WINDOW
+            or await self.is_deleted_message_in_audit_log(
+                channel.guild, record))
 
         if not is_considered_normal:
-            await self.report_suspicious_message(message, targeted_member)
+            await self.report_suspicious_message(record, channel)
+
+    async def cog_unload(self):
+        await self.actions.close()
 
 
 async def setup(bot):
@@ -5,6 +5,8 @@ from discord import app_commands, Interaction
 from discord.ext import commands
 import discord
 
+from utils.logs import stop_logging
+
 
 class CommandsOwner(commands.Cog):
     """All of the owner commands."""
@@ -14,7 +16,7 @@ class CommandsOwner(commands.Cog):
 
     @staticmethod
     def is_owner(itx: Interaction):
-        return itx.user == itx.client.owner
+        return itx.client.trust.is_owner(itx.user)
 
     @app_commands.check(is_owner)
     @app_commands.command()
@@ -25,8 +27,11 @@ class CommandsOwner(commands.Cog):
         restart: str = None,
         sync: str = None,
         shutdown: bool = False,
+        stats: bool = False,
     ):
         """Bot owner command 🤔. I can't hide this, blame Discord"""
+        if stats:
+            return await self.show_stats(itx)
         if restart:
             return await self.restart(itx, restart)
         if sync:
@@ -38,16 +43,33 @@ class CommandsOwner(commands.Cog):
         """Restart specific cog of the bot or all of it."""
         await itx.response.defer(ephemeral=True)
 
+        # Other workers only follow restarts that are known to work here
         if cog == "full":
             await itx.followup.send("(restarting)")
-            await self.bot.close()
-            os.execl(sys.executable, sys.executable, *sys.argv)
+            await self.bot.publish("restart", cog=cog)
+            await self.restart_process()
+
+        if cog not in self.bot.cog_file_names:
+            return await itx.followup.send(f"No cog named '{cog}'")
 
         try:
             await self.bot.reload_extension(f"cogs.{cog}")
-            await itx.followup.send(f"Reloaded 'cogs.{cog}'", ephemeral=True)
         except Exception as e:
-            await itx.followup.send(e)
+            return await itx.followup.send(e)
+
+        await self.bot.publish("restart", cog=cog)
+        await itx.followup.send(f"Reloaded 'cogs.{cog}'", ephemeral=True)
+
+    async def restart_process(self):
+        """Replace this process with a new one, started the same way.
+
+        Closing unloads every cog, and the states they export are handed
+        over to the new process through a file.
+        """
+        await self.bot.close()
+        self.bot.write_handoff()
+        stop_logging()  # exec skips atexit, which would write queued records
+        os.execl(sys.executable, sys.executable, *sys.argv)
 
     async def sync(self, itx: Interaction, guild_id: str):
         """Sync changes that should be reflected on the Discord UI."""
@@ -58,9 +80,58 @@ class CommandsOwner(commands.Cog):
 
         await itx.response.send_message("synced.", ephemeral=True)
 
+    async def show_stats(self, itx: Interaction):
+        """Show handler latencies, REST calls and cog state sizes."""
+        lines = []
+        metrics = self.bot.metrics
+
+        if metrics:
+            lines.append("handler (calls, errors): p50 / p95 / p99 ms")
+            handlers = sorted(
+                metrics.handlers.items(),
+                key=lambda item: item[1].quantiles()[0.99],
+                reverse=True)
+
+            for (kind, name), histogram in handlers[:15]:
+                p50, p95, p99 = histogram.quantiles().values()
+                lines.append(
+                    f"{kind} {name} ({histogram.calls}, {histogram.errors}): "
+                    f"{p50 * 1000:.1f} / {p95 * 1000:.1f} / {p99 * 1000:.1f}")
+
+            lag = metrics.loop_lag.quantiles()
+            rest_calls = sum(h.calls for h in metrics.requests.values())
+            rest_errors = sum(h.errors for h in metrics.requests.values())
+            lines.append(
+                f"event loop lag p99: {lag[0.99] * 1000:.1f} ms, "
+                f"REST calls: {rest_calls} ({rest_errors} failed)")
+        else:
+            lines.append("(start with --metrics-port to time handlers)")
+
+        for cog in self.bot.cogs.values():
+            if hasattr(cog, "stats"):
+                values = ", ".join(f"{k}={v}" for k, v in cog.stats().items())
+                lines.append(f"{cog.qualified_name}: {values}")
+
+        content = "\n".join(lines)[:1900]
+        await itx.response.send_message(f"```\n{content}```", ephemeral=True)
+
     async def shutdown(self, itx: Interaction):
         """Shutdown the bot properly."""
         await itx.response.send_message("(shutting down)", ephemeral=True)
+        await self.bot.publish("shutdown")
+        await self.bot.close()
+
+    @commands.Cog.listener()
+    async def on_coordinator_restart(self, data: dict):
+        """Follow a restart done from another worker process."""
+        if data["cog"] == "full":
+            return await self.restart_process()
+
+        await self.bot.reload_extension(f"cogs.{data['cog']}")
+
+    @commands.Cog.listener()
+    async def on_coordinator_shutdown(self, data: dict):
+        """Follow a shutdown done from another worker process."""
         await self.bot.close()
 
     @owner.autocomplete("restart")
@@ -74,7 +145,7 @@ class CommandsOwner(commands.Cog):
 
     @owner.autocomplete("sync")
     async def sync_autocomplete(self, itx: Interaction, current: str):
-        if itx.user != self.bot.owner:
+        if not self.bot.trust.is_owner(itx.user):
             return []  # don't leak the bot guild names for no reason
 
         guilds = [
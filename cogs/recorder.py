@@ -0,0 +1,52 @@
+import logging
+
+from discord.ext import commands, tasks
+
+from utils.recording import Anonymiser, RecordingWriter, recorded_dispatch
+
+
+class GatewayRecorder(commands.Cog):
+    """Record anonymised gateway dispatches, to replay them with replay.py."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.anonymiser = Anonymiser()
+        self.writer = RecordingWriter(bot.record_path, self.anonymiser)
+        self.refresh_kept_words.start()
+        logging.info(f"Recording gateway events to {bot.record_path}")
+
+    def kept_words(self):
+        """Words of tag names, codes and article titles, left readable."""
+        words = set()
+        if tag := self.bot.get_cog("CommandsTag"):
+            for namespace in tag.namespaces:
+                for name, value in namespace.db.items():
+                    for alias in [name] + value["aliases"]:
+                        words.update(alias.lower().split())
+            for title in tag.articles:
+                words.update(title.lower().split())
+            words.update(tag.codes)
+        return words
+
+    @tasks.loop(hours=1)
+    async def refresh_kept_words(self):
+        self.anonymiser.keep = self.kept_words()
+
+    @refresh_kept_words.before_loop
+    async def before_refresh_kept_words(self):
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_socket_raw_receive(self, message: str):
+        """Record a dispatch, given as the raw JSON text Discord sent."""
+        if dispatch := recorded_dispatch(message):
+            self.writer.write(*dispatch)
+
+    async def cog_unload(self):
+        self.refresh_kept_words.cancel()
+        self.writer.close()
+        logging.info(f"Recorded {self.writer.count} gateway events")
+
+
+async def setup(bot):
+    await bot.add_cog(GatewayRecorder(bot))
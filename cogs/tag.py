@@ -1,21 +1,30 @@
-import xml.etree.ElementTree as ET
-from contextlib import suppress
 from typing import Union
-import pickle
-import string
+import asyncio
+import time
 
 from discord import app_commands, Interaction
 from discord.ext import commands, tasks
 import discord
 import aiohttp
 
+from utils.snapshot import load_snapshot, save_snapshot
+from utils.sitemap import SitemapParser, article_from_loc
+from utils.namespaces import GLOBAL, TagNamespace, TagNamespaces
+from utils.autocomplete import AutocompleteIndex
+from utils.cache import VersionedLRU
+from utils.search import ArticleSearch
+from utils.http import ConditionalFetcher
+from utils.tag_store import TagStore
+from utils.codes import CodeIndex
+
 
 URL_CODES_JSON = "https://public.parsec.app/data/errors/codes.json"
 URL_SITEMAP_XML = "https://support.parsec.app/hc/sitemap.xml"
-USERS_WITH_EDIT_PERMISSION = (
-    124207277174423552,  # Kodikuu
-    141336932213981184,  # Skippy
-    289887222310764545)  # Borgo
+SITEMAP_CHUNK_SIZE = 2 ** 16
+SNAPSHOT_PATH = "codes_and_articles.p"
+RESPONSE_CACHE_SIZE = 1024
+MAX_CACHED_QUERY_LENGTH = 100  # longer ones are pasted, rarely repeated
+MAX_LOADED_TAGS = 20_000  # across guilds, least recently used are unloaded
 
 
 class CommandsTag(commands.Cog):
@@ -23,92 +32,231 @@ class CommandsTag(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.db = self.load_db()
+        self.namespaces = self.load_db()
         self.codes = {}
+        self.code_index = CodeIndex(self.codes)
         self.articles = {}
+        self.article_locs = {}
+        self.article_search = ArticleSearch()
+        self.fetcher = ConditionalFetcher()
+        self.fetched_at = None
+        self.responses = VersionedLRU(RESPONSE_CACHE_SIZE)
+
+        self.autocomplete = AutocompleteIndex()  # codes and articles
 
         self.auto_db_save.start()
-        self.auto_fetch_codes_and_sitemap.start()
 
         self.bot.tree.add_command(app_commands.ContextMenu(
             name="Send tags in this message",
             callback=self.send_tags_menu))
 
+    async def cog_load(self):
+        """Serve codes and articles from the last snapshot until fetched.
+
+        The fetch loop only starts afterwards, so a quick fetch can't be
+        overwritten with older data from the snapshot. After a reload, the
+        state handed over by the previous instance is used instead.
+        """
+        if self.fetched_at is None:
+            snapshot = await asyncio.to_thread(load_snapshot, SNAPSHOT_PATH)
+            if snapshot:
+                self.import_state(snapshot)
+
+        self.auto_fetch_codes_and_sitemap.start()
+
+    def export_state(self):
+        """Fetched codes and articles, with what's needed to fetch them."""
+        return {
+            "codes": self.codes,
+            "code_index": self.code_index,
+            "article_locs": self.article_locs,
+            "validators": dict(self.fetcher.validators),
+            "fetched_at": self.fetched_at}
+
+    def import_state(self, state: dict):
+        self.update_codes(state["codes"], state["code_index"])
+        self.article_locs = state["article_locs"]
+        self.update_articles(list(self.article_locs))
+        self.fetcher.validators.update(state["validators"])
+        self.fetched_at = state.get("fetched_at")
+
+    def stats(self):
+        """Size of the tag, code and article indexes."""
+        return {
+            "tags": sum(map(len, self.namespaces)),
+            "tag_namespaces": len(self.namespaces.loaded),
+            "codes": len(self.codes),
+            "articles": len(self.articles),
+            "article_search_terms": len(self.article_search.postings),
+            "autocomplete_entries": len(self.autocomplete.entries) + sum(
+                len(namespace.autocomplete.entries)
+                for namespace in self.namespaces),
+            **{
+                f"response_cache_{key}": value
+                for key, value in self.responses.stats().items()}}
+
     def load_db(self):
-        """Load pickle database."""
-        try:
-            with open("db.p", "rb") as file:
-                db = pickle.load(file)
-        except FileNotFoundError:
-            db = {}
-
-        return db
-
-    def save_db(self):
-        """Save pickle database if applicable."""
-        if not self.db:
-            return
+        """Open the tag store, migrating the old pickle database once."""
+        self.store = TagStore()
+        return TagNamespaces(self.store, MAX_LOADED_TAGS)
 
-        with open("db.p", "wb") as file:
-            pickle.dump(self.db, file)
+    async def save_db(self):
+        """Compact and snapshot the tag store off the event loop, if edited."""
+        if self.store.dirty:
+            await asyncio.to_thread(self.store.compact)
+
+    def set_tag(
+        self, namespace: TagNamespace, name: str, content: str, aliases: list
+    ):
+        """Create or update a custom tag and persist it."""
+        namespace.db[name] = {"content": content, "aliases": aliases}
+        self.store.put(name, content, aliases, namespace.guild_id)
+        self.update_tag_indexes(namespace, [name])
+
+    def remove_tag(self, namespace: TagNamespace, name: str):
+        """Remove a custom tag, if it exists, and persist that."""
+        if namespace.db.pop(name, None):
+            self.store.delete(name, namespace.guild_id)
+            self.update_tag_indexes(namespace, [name])
+
+    def reload_tags(self, guild_id: int):
+        """Load a guild's tags again, after another process edited them."""
+        if self.namespaces.reload(guild_id):
+            self.responses.bump()
+
+    def update_tag_indexes(self, namespace: TagNamespace, names: list):
+        """Refresh the tag matcher and autocomplete after tag edits."""
+        namespace.update(names)
+        self.responses.bump()
 
     async def fetch_codes_and_sitemap(self):
-        """Fetch the Parsec codes and the support page sitemap."""
-        xml = None
-        with suppress(aiohttp.ClientConnectorError):
-            async with aiohttp.ClientSession() as session:
-                async with session.get(URL_CODES_JSON) as resp:
-                    if resp.status == 200:
-                        self.codes = await resp.json()
-
-                async with session.get(URL_SITEMAP_XML) as resp:
-                    if resp.status == 200:
-                        xml = await resp.text()
-
-        if not xml:
-            return
+        """Fetch the Parsec codes and the support page sitemap if changed."""
+        codes, locs = await asyncio.gather(
+            self.fetcher.fetch(URL_CODES_JSON, self.read_codes),
+            self.fetcher.fetch(URL_SITEMAP_XML, self.read_sitemap))
+        self.fetched_at = time.time()
 
-        namespaces = {"ns0": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        root = ET.fromstring(xml)
+        if codes is not None:
+            self.update_codes(*codes)
+        if locs is not None:
+            self.update_articles(locs)
 
-        for url in root.findall("ns0:url/ns0:loc", namespaces):
-            if url.text == "https://support.parsec.app/hc/en-us":
-                continue
+        if codes is not None or locs is not None:
+            await self.save_snapshot()
 
-            url, title = url.text.replace("/en-us/", "/").split("-", 1)
-            title = title.replace("-", " ")
-            title = title.replace(" t ", "'t ")  # e.g. Don t -> Don't
-            title = title.replace(" re ", "'re ")  # e.g. You re -> You're
+    async def save_snapshot(self):
+        """Store what was fetched, so a restart doesn't wait on fetching."""
+        await asyncio.to_thread(
+            save_snapshot, SNAPSHOT_PATH, self.export_state())
+
+    @staticmethod
+    async def read_codes(resp: aiohttp.ClientResponse):
+        """Parse and index the codes JSON from its response."""
+        codes = await resp.json()
+        return codes, CodeIndex(codes)
 
-            self.articles[title] = url
+    @staticmethod
+    async def read_sitemap(resp: aiohttp.ClientResponse):
+        """Stream the sitemap XML into a parser running in a worker thread."""
+        parser = SitemapParser()
+        async for chunk in resp.content.iter_chunked(SITEMAP_CHUNK_SIZE):
+            await asyncio.to_thread(parser.feed, chunk)
+
+        return await asyncio.to_thread(parser.close)
+
+    def update_articles(self, locs: list):
+        """Apply the differences between the stored and fetched articles."""
+        article_locs = {}
+        for loc in locs:
+            if loc in self.article_locs:
+                article_locs[loc] = self.article_locs[loc]
+            elif article := article_from_loc(loc):
+                article_locs[loc] = article
+
+        articles = dict(article_locs.values())
+
+        for title in self.articles.keys() - articles.keys():
+            self.autocomplete.remove("article", title)
+            self.article_search.remove(title)
+        for title in articles.keys() - self.articles.keys():
+            self.autocomplete.add("article", title)
+            self.article_search.add(title)
+
+        self.article_locs = article_locs
+        self.articles = articles
+        self.responses.bump()
+
+    def update_codes(self, codes: dict, code_index: CodeIndex):
+        """Replace the stored codes and the indexes built from them."""
+        for code in self.codes.keys() - codes.keys():
+            self.autocomplete.remove("code", code)
+        for code in codes.keys() - self.codes.keys():
+            self.autocomplete.add("code", code)
+
+        self.codes = codes
+        self.code_index = code_index
+        self.responses.bump()
 
     @tasks.loop(minutes=1)
     async def auto_db_save(self):
-        """Save database every minute to avoid unexpected data loss."""
-        self.save_db()
+        """Compact the database every minute if there were any edits."""
+        await self.save_db()
 
     @tasks.loop(hours=5)
     async def auto_fetch_codes_and_sitemap(self):
         """Keep stored codes and sitemap updated by fetching every 5 hours."""
         await self.fetch_codes_and_sitemap()
 
+    @auto_fetch_codes_and_sitemap.before_loop
+    async def before_auto_fetch_codes_and_sitemap(self):
+        """Don't fetch again before the interval is over, after a restart."""
+        if self.fetched_at:
+            interval = self.auto_fetch_codes_and_sitemap.hours * 3600
+            await asyncio.sleep(self.fetched_at + interval - time.time())
+
+    @staticmethod
+    def can_edit_global(itx: Interaction):
+        """Whether the user is the bot owner or may edit global tags."""
+        return itx.client.trust.is_tag_editor(itx.user)
+
+    @staticmethod
+    def can_edit_guild(itx: Interaction):
+        """Whether the user manages the guild, to edit its own tags."""
+        return bool(itx.guild_id and itx.permissions.manage_guild)
+
     @staticmethod
     def can_edit(itx: Interaction):
-        """Check to allow bot owner and specific user IDs to edit tags."""
+        """Check to allow global tag editors and guild managers to edit."""
         return (
-            itx.user == itx.client.owner
-            or itx.user.id in USERS_WITH_EDIT_PERMISSION)
+            CommandsTag.can_edit_global(itx)
+            or CommandsTag.can_edit_guild(itx))
+
+    def editable_namespaces(self, itx: Interaction):
+        """Namespaces the user may edit, in the order tags are looked up."""
+        namespaces = []
+        if self.can_edit_guild(itx):
+            namespaces.append(self.namespaces.get(itx.guild_id))
+        if self.can_edit_global(itx):
+            namespaces.append(self.namespaces.get(GLOBAL))
+        return namespaces
+
+    def get_custom_tag_responses(self, query: str, guild_id: int = GLOBAL):
+        """Get responses for custom tags in database based on the query.
+
+        A guild's own tags come first, then global tags it doesn't have.
+        A global tag the guild overrides is left out even when the query
+        only names one of its global aliases.
+        """
+        responses = []
+        earlier_dbs = []
 
-    def get_custom_tag_responses(self, query: str):
-        """Get responses for custom tags in database based on the query."""
-        custom_tag_responses = []
-        for main_tag_name, value in self.db.items():
-            for name in [main_tag_name] + value["aliases"]:
-                if name in query.lower():
-                    custom_tag_responses.append(value["content"])
-                    break
+        for namespace in self.namespaces.chain(guild_id):
+            for main_tag_name in namespace.matcher.find(query):
+                if not any(main_tag_name in db for db in earlier_dbs):
+                    responses.append(namespace.db[main_tag_name]["content"])
+            earlier_dbs.append(namespace.db)
 
-        return custom_tag_responses
+        return responses
 
     def get_code_responses(
             self,
@@ -117,31 +265,41 @@ class CommandsTag(commands.Cog):
             ignore_single_digits: bool = False
     ):
         """Get responses for error codes based on the query."""
-        for character in string.punctuation.replace("-", ""):
-            query = query.replace(character, "")
-
-        code_responses = []
-        codes_sorted_decreasing_and_signless = sorted(
-            self.codes.items(), key=lambda i: abs(int(i[0])), reverse=True)
-
-        for code, details in codes_sorted_decreasing_and_signless:
-            if ignore_single_digits and len(code.replace("-", "")) == 1:
-                continue
-
-            if code in query.split() or code.replace("-", "") in query.split():
-                header_title = details["title"] or details["desc"]
-                code_response = [f"## Error Code [{code}] {header_title}"]
+        return self.code_index.find(
+            query, ignore_single_digits=ignore_single_digits)
 
-                if details["title"]:
-                    code_response.append(details["desc"])
-                if "support.parsec.app" in details["url"]:
-                    code_response.append(
-                        f"[**Read the article for more details**]"
-                        f"(<{details['url']}>)")
+    def get_article_response(self, title: str):
+        return f"**[{title}](<{self.articles[title]}>)**"
 
-                code_responses.append("\n".join(code_response))
+    def get_responses(self, query: str, guild_id: int = GLOBAL):
+        """Get the response lines for a query, cached until data changes.
 
-        return code_responses
+        Tag and code matching ignore case, so other queries are cached in
+        lowercase, per guild; article titles have to match exactly and are
+        cheap.
+        Articles are searched by title words only when nothing else matched.
+        """
+        if query in self.articles:
+            return (self.get_article_response(query),)
+
+        key = (guild_id or GLOBAL, query.lower())
+        responses = self.responses.get(key)
+        if responses is not None:
+            return responses
+
+        version = self.responses.version
+        responses = self.get_custom_tag_responses(query, guild_id)
+        responses.extend(self.get_code_responses(
+            query, ignore_single_digits=bool(responses)))
+        if not responses:
+            responses.extend(
+                self.get_article_response(title)
+                for title in self.article_search.search(query))
+        responses = tuple(responses)
+
+        if len(query) <= MAX_CACHED_QUERY_LENGTH:
+            self.responses.set(key, responses, version)
+        return responses
 
     async def tag_base(
         self,
@@ -156,16 +314,9 @@ class CommandsTag(commands.Cog):
             await itx.response.send_message("yep thats me.", ephemeral=True)
             return
 
-        response = []
+        response = list(self.get_responses(query, itx.guild_id))
         allowed_mentions = discord.AllowedMentions.none()
 
-        if query in self.articles:
-            response.append(f"**[{query}](<{self.articles[query]}>)**")
-        else:
-            response.extend(self.get_custom_tag_responses(query))
-            response.extend(self.get_code_responses(
-                query, ignore_single_digits=bool(response)))
-
         if not response:
             await itx.response.send_message("(nothing found)", ephemeral=True)
             return
@@ -205,56 +356,77 @@ class CommandsTag(commands.Cog):
     @app_commands.command()
     async def edit_tag(self, itx: Interaction, tag_name: str):
         """Edit a custom tag."""
-        for main_tag_name, value in self.db.items():
-            for name in [main_tag_name] + value["aliases"]:
-                if tag_name.lower().strip() == name:
-                    tag_name = main_tag_name
-                    break
-
-        await itx.response.send_modal(
-            EditTagModal(self.db, tag_name.lower().strip()))
-
-    def autocomplete_base(self, current, *, custom_tags_only=False):
-        """Autocomplete for /tag and /edit_tag commands."""
-        choices = []
-
-        for name, value in sorted(self.db.items()):
-            if value["aliases"]:
-                aliases = ", ".join(value["aliases"])
-                choices.append(app_commands.Choice(
-                    name=f"{name} (aliases: {aliases})"[:99], value=name))
-            else:
-                choices.append(app_commands.Choice(name=name[:99], value=name))
+        tag_name = tag_name.lower().strip()
+        namespaces = self.editable_namespaces(itx)
+
+        # New tags of global tag editors stay global, as before guilds had
+        # their own; existing ones are edited where /tag would find them
+        namespace = namespaces[-1]
+        for candidate in namespaces:
+            if main_tag_name := candidate.resolve(tag_name):
+                namespace, tag_name = candidate, main_tag_name
+                break
+
+        await itx.response.send_modal(EditTagModal(self, namespace, tag_name))
+
+    def autocomplete_base(
+        self, current, namespaces: list, *, custom_tags_only=False
+    ):
+        """Autocomplete for /tag and /edit_tag commands.
 
+        Tags of each namespace are suggested in order, a name only once,
+        followed by codes and articles (or preceded by an exact code).
+        """
+        indexes = [namespace.autocomplete for namespace in namespaces]
         if current and not custom_tags_only:
-            for name in list(self.codes.keys()) + list(self.articles.keys()):
-                choices.append(app_commands.Choice(name=name[:99], value=name))
+            if ("code", current.strip()) in self.autocomplete.entries:
+                indexes.insert(0, self.autocomplete)
+            else:
+                indexes.append(self.autocomplete)
 
-        return [c for c in choices if current.lower() in c.name.lower()][:25]
+        choices = {}
+        for index in indexes:
+            for choice in index.search(current, limit=25 - len(choices)):
+                choices.setdefault(choice.value, choice)
+            if len(choices) == 25:
+                break
+
+        return list(choices.values())
 
     @tag.autocomplete("query")
     async def tag_autocomplete(self, itx: Interaction, current: str):
-        return self.autocomplete_base(current)
+        return self.autocomplete_base(
+            current, self.namespaces.chain(itx.guild_id))
 
     @edit_tag.autocomplete("tag_name")
     async def edit_tag_autocomplete(self, itx: Interaction, current: str):
-        return self.autocomplete_base(current, custom_tags_only=True)
+        return self.autocomplete_base(
+            current, self.editable_namespaces(itx), custom_tags_only=True)
+
+    @commands.Cog.listener()
+    async def on_coordinator_tags_changed(self, data: dict):
+        self.reload_tags(data.get("guild_id", GLOBAL))
 
     async def send_tags_menu(self, itx: Interaction, message: discord.Message):
         await self.tag_base(itx, message.clean_content, message.author)
 
     async def cog_unload(self):
-        self.save_db()
+        self.auto_db_save.cancel()
+        self.auto_fetch_codes_and_sitemap.cancel()
+        await self.fetcher.close()
+        await self.save_db()
+        self.store.close()
 
 
 class EditTagModal(discord.ui.Modal, title="Edit tag"):
     """The modal that pops up when editing a custom tag with /edit_tag."""
 
-    def __init__(self, db, tag_name):
+    def __init__(self, cog: CommandsTag, namespace: TagNamespace, tag_name):
         super().__init__()
-        self.db = db
+        self.cog = cog
+        self.guild_id = namespace.guild_id
         self.tag_name = tag_name
-        self.tag_dict = self.db.get(tag_name)
+        self.tag_dict = namespace.db.get(tag_name)
         self.content = self.tag_dict["content"] if self.tag_dict else None
         self.aliases = self.tag_dict["aliases"] if self.tag_dict else []
 
@@ -281,9 +453,11 @@ class EditTagModal(discord.ui.Modal, title="Edit tag"):
 
     async def on_submit(self, itx: Interaction):
         tag_name, content, aliases = [c.value for c in self.children]
+        # Looked up again, in case it was unloaded while the modal was open
+        namespace = self.cog.namespaces.get(self.guild_id)
 
         if not tag_name or not content:
-            self.db.pop(self.tag_name, None)
+            self.cog.remove_tag(namespace, self.tag_name)
         else:
             tag_name = tag_name.lower().strip()
             content = content.strip()
@@ -293,13 +467,12 @@ class EditTagModal(discord.ui.Modal, title="Edit tag"):
                 aliases = []
 
             if self.tag_name != tag_name:
-                self.db.pop(self.tag_name, None)
+                self.cog.remove_tag(namespace, self.tag_name)
 
-            self.db[tag_name] = {}
-            self.db[tag_name]["content"] = content
-            self.db[tag_name]["aliases"] = aliases
+            self.cog.set_tag(namespace, tag_name, content, aliases)
 
         await itx.response.defer()
+        await itx.client.publish("tags_changed", guild_id=self.guild_id)
 
 
 async def setup(bot):
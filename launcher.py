@@ -0,0 +1,77 @@
+"""Run Golem as several processes, each with its own range of shards."""
+import argparse
+import logging
+import asyncio
+import secrets
+import sys
+import os
+
+from utils.coordinator import TOKEN_VARIABLE, Coordinator
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S")
+
+
+def shard_ranges(shard_count: int, processes: int):
+    """Split shard IDs into contiguous, evenly sized ranges."""
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+
+    for process in range(processes):
+        end = start + size + (process < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return [shard_ids for shard_ids in ranges if shard_ids]
+
+
+async def run_worker(
+    shard_ids: list, shard_count: int, port: int, token: str,
+    bot_arguments: list
+):
+    """Run one bot process, starting it again if it stops unexpectedly."""
+    environment = {**os.environ, TOKEN_VARIABLE: token}
+
+    while True:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "bot.py",
+            "--sharded",
+            "--shard-count", str(shard_count),
+            "--shard-ids", ",".join(map(str, shard_ids)),
+            "--coordinator", str(port),
+            *bot_arguments,
+            env=environment)
+
+        code = await process.wait()
+        if code == 0:
+            logging.info(f"Worker for shards {shard_ids} shut down")
+            return
+
+        logging.error(f"Worker for shards {shard_ids} exited with {code}")
+        await asyncio.sleep(5)
+
+
+async def main(arguments: argparse.Namespace, bot_arguments: list):
+    token = secrets.token_hex(32)
+    coordinator = Coordinator(arguments.port, token)
+    await coordinator.start()
+
+    await asyncio.gather(*(
+        run_worker(
+            shard_ids, arguments.shards, arguments.port, token,
+            bot_arguments)
+        for shard_ids in shard_ranges(arguments.shards, arguments.processes)))
+
+    await coordinator.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, epilog="Other arguments are passed to bot.py.")
+    parser.add_argument("--shards", type=int, required=True)
+    parser.add_argument("--processes", type=int, required=True)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(*parser.parse_known_args()))
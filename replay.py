@@ -0,0 +1,262 @@
+"""Replay a gateway recording into Golem, faster than real time.
+
+Record with `python bot.py --record events.jsonl.gz`, then for example:
+
+    python replay.py events.jsonl.gz --speed 20 --tags db.sqlite
+
+Discord's REST API is replaced by a mock that answers with plausible
+payloads and counts every call, so nothing is sent anywhere. The replay
+runs in a temporary directory, starting from a copy of the given tags.
+
+The mock is swapped in through discord.py internals, `Client._async_setup_hook`
+and the `request` methods of `HTTPClient` and `AsyncWebhookAdapter`, so this
+is written against the discord.py version pinned in requirements.txt
+(`DISCORD_VERSION`). Check those still exist before moving the pin.
+"""
+from collections import Counter, defaultdict
+import argparse
+import itertools
+import logging
+import tempfile
+import asyncio
+import sqlite3
+import time
+import os
+
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+from discord.http import Route
+import discord
+
+from bot import GolemBot
+from utils.logs import setup_logging
+from utils.metrics import Histogram, Metrics
+from utils.recording import read_recording, shift_snowflakes
+
+
+DISCORD_VERSION = "2.5.0"  # the internals replaced below are of this one
+ACTIONS = {  # REST routes worth reporting as moderation or replies
+    ("DELETE", "/guilds/{guild_id}/members/{user_id}"): "kicks",
+    ("PATCH", "/guilds/{guild_id}/members/{user_id}"): "timeouts",
+    ("DELETE", "/channels/{channel_id}/messages/{message_id}"): "deletions",
+    ("POST", "/channels/{channel_id}/messages/bulk-delete"): "bulk deletions",
+    ("POST", "/channels/{channel_id}/messages"): "messages sent",
+    ("POST", "/interactions/{webhook_id}/{webhook_token}/callback"):
+        "interaction responses",
+    ("POST", "/webhooks/{webhook_id}/{webhook_token}"): "followups"}
+
+
+class MockDiscord:
+    """Answer REST calls the way Discord would, without any network."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.sequence = itertools.count()
+        self.user = {  # replaced by the bot user from READY
+            "id": "1", "username": "golem", "discriminator": "0",
+            "avatar": None, "bot": True}
+        self.owner = {
+            "id": "2", "username": "owner", "discriminator": "0",
+            "avatar": None}
+
+    async def request(self, route: Route, **kwargs):
+        self.calls[route.method, route.path] += 1
+        payload = kwargs.get("json") or kwargs.get("payload") or {}
+
+        if route.path == "/oauth2/applications/@me":
+            return {
+                "id": self.user["id"], "name": "Golem", "icon": None,
+                "description": "", "bot_public": False,
+                "bot_require_code_grant": False, "verify_key": "",
+                "owner": self.owner}
+        if route.path == "/guilds/{guild_id}/audit-logs":
+            return {
+                key: [] for key in (
+                    "audit_log_entries", "users", "integrations",
+                    "webhooks", "guild_scheduled_events", "threads",
+                    "application_commands", "auto_moderation_rules")}
+        if route.path == "/channels/{channel_id}/messages/{message_id}":
+            if route.method == "GET":  # deletions were replayed as events
+                return self.message(route.channel_id, payload)
+            return None
+        if route.path == "/guilds/{guild_id}/members/{user_id}":
+            if route.method == "PATCH":
+                return self.member(route.url.rsplit("/", 1)[1])
+            return None
+        if route.path.endswith("/callback"):
+            return {"interaction": {"id": str(route.webhook_id), "type": 2}}
+        if route.method in ("POST", "PATCH") and (
+                route.path == "/channels/{channel_id}/messages"
+                or route.path.startswith("/webhooks/")):
+            return self.message(route.channel_id or 0, payload)
+        return None
+
+    async def webhook_request(self, route: Route, session, **kwargs):
+        return await self.request(route, **kwargs)
+
+    def snowflake(self):
+        return discord.utils.time_snowflake(
+            discord.utils.utcnow()) + next(self.sequence) % (1 << 22)
+
+    def message(self, channel_id: int, payload: dict):
+        return {
+            "id": str(self.snowflake()), "channel_id": str(channel_id),
+            "author": self.user, "content": payload.get("content") or "",
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0}
+
+    def member(self, user_id: str):
+        return {
+            "user": {
+                "id": user_id, "username": "member", "discriminator": "0",
+                "avatar": None},
+            "roles": [], "joined_at": discord.utils.utcnow().isoformat(),
+            "deaf": False, "mute": False, "flags": 0}
+
+
+def rebase(events: list):
+    """Move IDs and timestamps so the recording seems to start right now.
+
+    Message ages are worked out from their IDs, so without this every
+    replayed message would look as old as the recording.
+    """
+    started = next(
+        (data["started"] for _, event, data in events
+         if event == "RECORDING"), None)
+    if started is None:
+        return events
+
+    shift = round(time.time() * 1000) - started
+    return [
+        (offset, event, shift_snowflakes(data, shift))
+        for offset, event, data in events]
+
+
+async def replay(bot: GolemBot, mock: MockDiscord, events: list, speed: float):
+    """Feed recorded dispatches to the gateway parsers on schedule."""
+    parsers = bot._connection.parsers
+    parse_times = defaultdict(Histogram)
+    behind = Histogram()
+    start = time.perf_counter()
+
+    for offset, event, data in events:
+        delay = start + offset / 1000 / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        behind.observe(max(0, -delay))
+
+        if event not in parsers:
+            continue
+        if event == "READY":
+            mock.user = data["user"]
+
+        began = time.perf_counter()
+        failed = True
+        try:
+            parsers[event](data)
+            failed = False
+        except Exception:
+            logging.exception(f"Failed to parse {event}")
+        parse_times[event].observe(time.perf_counter() - began, failed)
+        await asyncio.sleep(0)  # let handlers run, like between gateway reads
+
+    return parse_times, behind, time.perf_counter() - start
+
+
+def milliseconds(histogram: Histogram):
+    p50, p95, p99 = (v * 1000 for v in histogram.quantiles().values())
+    return f"{p50:8.2f} {p95:8.2f} {p99:8.2f}"
+
+
+def report(
+    events: list, speed: float, elapsed: float,
+    parse_times: dict, behind: Histogram, metrics: Metrics,
+    mock: MockDiscord, stats: dict
+):
+    recorded = events[-1][0] / 1000 if events else 0
+    print(f"Replayed {len(events)} events ({recorded:.1f}s recorded) in "
+          f"{elapsed:.1f}s, {recorded / max(elapsed, 1e-9):.1f}x "
+          f"(asked for {speed}x)")
+    print(f"Behind schedule p50/p95/p99 ms: {milliseconds(behind)}")
+    print(f"Event loop lag  p50/p95/p99 ms: {milliseconds(metrics.loop_lag)}")
+
+    print(f"\n{'event parsing':<48} {'count':>6}  p50/p95/p99 ms  errors")
+    for event, histogram in sorted(parse_times.items()):
+        print(f"{event:<48} {histogram.calls:>6}  "
+              f"{milliseconds(histogram)}  {histogram.errors}")
+
+    print(f"\n{'handlers':<48} {'calls':>6}  p50/p95/p99 ms  errors")
+    for (kind, name), histogram in sorted(metrics.handlers.items()):
+        if histogram.calls:
+            print(f"{kind + ' ' + name:<48} {histogram.calls:>6}  "
+                  f"{milliseconds(histogram)}  {histogram.errors}")
+
+    print(f"\n{'REST calls':<48} {'count':>6}")
+    for (method, path), count in mock.calls.most_common():
+        print(f"{method + ' ' + path:<48} {count:>6}")
+
+    print("\nActions: " + ", ".join(
+        f"{name} {mock.calls[route]}" for route, name in ACTIONS.items()))
+    for cog, values in stats.items():
+        print(f"{cog}: " + ", ".join(f"{k}={v}" for k, v in values.items()))
+
+
+async def main(arguments: argparse.Namespace):
+    if discord.__version__ != DISCORD_VERSION:
+        logging.warning(
+            f"Replay is written for discord.py {DISCORD_VERSION}, not "
+            f"{discord.__version__}, so the mock may not be in place")
+
+    events = read_recording(arguments.recording)
+    mock = MockDiscord()
+
+    adapter = AsyncWebhookAdapter()
+    adapter.request = mock.webhook_request
+    async_context.set(adapter)
+
+    bot = GolemBot(max_messages=arguments.max_messages or None)
+    bot.http.request = mock.request
+    bot.metrics = Metrics(bot)  # timed, but not served
+
+    await bot._async_setup_hook()
+    await bot.setup_hook()
+    if tag := bot.get_cog("CommandsTag"):
+        tag.auto_fetch_codes_and_sitemap.cancel()  # stay offline
+
+    parse_times, behind, elapsed = await replay(
+        bot, mock, rebase(events), arguments.speed)
+    await asyncio.sleep(arguments.settle)
+    stats = bot.metrics.cog_stats()
+
+    report(
+        events, arguments.speed, elapsed,
+        parse_times, behind, bot.metrics, mock, stats)
+    await bot.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="how many times faster than recorded")
+    parser.add_argument("--tags", metavar="FILE",
+                        help="tag database to start from (copied)")
+    parser.add_argument("--max-messages", type=int, default=1000,
+                        help="message cache size, 0 to disable it")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds to let handlers finish afterwards")
+    arguments = parser.parse_args()
+    arguments.recording = os.path.abspath(arguments.recording)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if arguments.tags:
+            source = sqlite3.connect(arguments.tags)
+            copy = sqlite3.connect(os.path.join(directory, "db.sqlite"))
+            source.backup(copy)
+            source.close()
+            copy.close()
+
+        os.chdir(directory)
+        setup_logging()
+        asyncio.run(main(arguments))
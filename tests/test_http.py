@@ -0,0 +1,143 @@
+"""ConditionalFetcher and the tag cog's fetching, against a local server."""
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from benchmarks.fakes import FakeBot
+from utils.http import ConditionalFetcher
+import cogs.tag
+
+CODES = {"-1": {"title": "Broken", "desc": "It broke", "url": ""}}
+SITEMAP = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><url>'
+    '<loc>https://support.parsec.app/hc/en-us/articles/1-Fixing-Things'
+    '</loc></url></urlset>')
+
+
+class StandIn:
+    """Serves queued responses in order, remembering the request headers."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def queue(self, status=200, body="", etag=None):
+        headers = {"ETag": etag} if etag else {}
+        headers["Content-Type"] = (
+            "text/xml" if body.startswith("<") else "application/json")
+        self.responses.append((status, body, headers))
+
+    async def handle(self, request: web.Request):
+        self.requests.append(dict(request.headers))
+        status, body, headers = self.responses.pop(0)
+        if status == 304:
+            return web.Response(status=304, headers=headers)
+        return web.Response(status=status, text=body, headers=headers)
+
+
+async def serve(stand_in: StandIn):
+    app = web.Application()
+    app.router.add_get("/{name}", stand_in.handle)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+async def read_json(resp):
+    return await resp.json()
+
+
+def run(test):
+    async def wrapper():
+        stand_in = StandIn()
+        server = await serve(stand_in)
+        fetcher = ConditionalFetcher(backoff=0)
+        try:
+            await test(stand_in, str(server.make_url("/codes")), fetcher)
+        finally:
+            await fetcher.close()
+            await server.close()
+
+    asyncio.run(wrapper())
+
+
+def test_unchanged_resource_is_skipped():
+    async def test(stand_in, url, fetcher):
+        stand_in.queue(body=json.dumps(CODES), etag='"v1"')
+        stand_in.queue(status=304, etag='"v1"')
+
+        assert await fetcher.fetch(url, read_json) == CODES
+        assert await fetcher.fetch(url, read_json) is None
+        assert "If-None-Match" not in stand_in.requests[0]
+        assert stand_in.requests[1]["If-None-Match"] == '"v1"'
+
+    run(test)
+
+
+def test_server_errors_and_rate_limits_are_retried():
+    async def test(stand_in, url, fetcher):
+        stand_in.queue(status=503)
+        stand_in.queue(status=429)
+        stand_in.queue(body=json.dumps(CODES))
+
+        assert await fetcher.fetch(url, read_json) == CODES
+        assert len(stand_in.requests) == 3
+
+        for _ in range(fetcher.retries + 1):
+            stand_in.queue(status=500)
+        assert await fetcher.fetch(url, read_json) is None
+
+    run(test)
+
+
+def test_unparsable_response_keeps_old_validators():
+    async def test(stand_in, url, fetcher):
+        stand_in.queue(body=json.dumps(CODES), etag='"v1"')
+        stand_in.queue(body="{not json", etag='"v2"')
+        stand_in.queue(body=json.dumps(CODES), etag='"v3"')
+
+        assert await fetcher.fetch(url, read_json) == CODES
+        assert await fetcher.fetch(url, read_json) is None
+        assert await fetcher.fetch(url, read_json) == CODES
+        # The broken version was never accepted, so it wasn't asked about
+        assert stand_in.requests[2]["If-None-Match"] == '"v1"'
+
+    run(test)
+
+
+def test_tag_cog_keeps_last_good_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def test():
+        codes, sitemap = StandIn(), StandIn()
+        codes_server, sitemap_server = await serve(codes), await serve(sitemap)
+        monkeypatch.setattr(
+            cogs.tag, "URL_CODES_JSON", str(codes_server.make_url("/codes")))
+        monkeypatch.setattr(
+            cogs.tag, "URL_SITEMAP_XML", str(sitemap_server.make_url("/map")))
+
+        cog = cogs.tag.CommandsTag(FakeBot())
+        cog.auto_db_save.cancel()
+        cog.fetcher.backoff = 0
+        try:
+            codes.queue(body=json.dumps(CODES), etag='"v1"')
+            sitemap.queue(body=SITEMAP, etag='"v1"')
+            await cog.fetch_codes_and_sitemap()
+            assert list(cog.codes) == ["-1"]
+            assert list(cog.articles) == ["Fixing Things"]
+
+            codes.queue(body="{not json", etag='"v2"')
+            sitemap.queue(status=304)
+            await cog.fetch_codes_and_sitemap()
+            assert list(cog.codes) == ["-1"]
+            assert list(cog.articles) == ["Fixing Things"]
+            assert cog.get_code_responses("-1")
+        finally:
+            await cog.cog_unload()
+            await codes_server.close()
+            await sitemap_server.close()
+
+    asyncio.run(test())
@@ -0,0 +1,118 @@
+"""Record raw gateway messages with the recorder cog, then replay them."""
+import asyncio
+import json
+import os
+
+import discord
+
+from cogs.recorder import GatewayRecorder
+from replay import MockDiscord, rebase, replay
+from utils.recording import read_recording, recorded_dispatch
+from bot import GolemBot
+
+GUILD_ID = "1100000000000000001"
+CHANNEL_ID = "1100000000000000002"
+USER_ID = "1100000000000000003"
+BOT_ID = "1100000000000000004"
+MESSAGE_ID = "1100000000000000005"
+
+
+def user(user_id: str, name: str):
+    return {
+        "id": user_id, "username": name, "global_name": name,
+        "discriminator": "0", "avatar": "abc", "bot": user_id == BOT_ID}
+
+
+def gateway_messages():
+    """Raw gateway messages, as Discord sends them, some not recorded."""
+    dispatches = [
+        ("READY", {
+            "v": 10, "user": user(BOT_ID, "golem"), "guilds": [],
+            "session_id": "secret", "resume_gateway_url": "wss://x",
+            "application": {"id": BOT_ID, "flags": 0}}),
+        ("PRESENCE_UPDATE", {"user": {"id": USER_ID}}),
+        ("GUILD_CREATE", {
+            "id": GUILD_ID, "name": "Parsec", "owner_id": USER_ID,
+            "roles": [{
+                "id": GUILD_ID, "name": "@everyone", "permissions": "0",
+                "position": 0, "color": 0, "hoist": False,
+                "managed": False, "mentionable": False, "flags": 0}],
+            "channels": [{
+                "id": CHANNEL_ID, "type": 0, "name": "help",
+                "position": 0, "permission_overwrites": []}],
+            "members": [], "threads": [], "emojis": [], "stickers": [],
+            "features": [], "member_count": 2, "large": False,
+            "unavailable": False}),
+        ("MESSAGE_CREATE", {
+            "id": MESSAGE_ID, "channel_id": CHANNEL_ID,
+            "guild_id": GUILD_ID, "author": user(USER_ID, "someone"),
+            "member": {"roles": [], "joined_at": None, "flags": 0},
+            "content": "my private address is here",
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0,
+            "flags": 0}),
+        ("MESSAGE_DELETE", {
+            "id": MESSAGE_ID, "channel_id": CHANNEL_ID,
+            "guild_id": GUILD_ID})]
+
+    messages = [json.dumps({"op": 11, "d": None})]
+    for sequence, (event, data) in enumerate(dispatches, 1):
+        messages.append(json.dumps(
+            {"t": event, "s": sequence, "op": 0, "d": data},
+            separators=(",", ":")))
+    return messages
+
+
+def test_recorded_dispatch():
+    heartbeat_ack, ready, presence, *_ = gateway_messages()
+    assert recorded_dispatch(heartbeat_ack) is None
+    assert recorded_dispatch(presence) is None
+    assert recorded_dispatch(ready)[0] == "READY"
+    assert recorded_dispatch(ready.encode())[0] == "READY"
+
+
+async def record(path: str):
+    bot = discord.Client(intents=discord.Intents.none())
+    bot.record_path = path
+    recorder = GatewayRecorder(bot)
+    try:
+        for message in gateway_messages():
+            await recorder.on_socket_raw_receive(message)
+    finally:
+        await recorder.cog_unload()
+    return recorder.writer.count
+
+
+async def replay_recording(path: str):
+    events = read_recording(path)
+    bot = GolemBot()
+    mock = MockDiscord()
+    bot.http.request = mock.request
+    await bot._async_setup_hook()
+    try:
+        parse_times, _, _ = await replay(bot, mock, rebase(events), 1000)
+        await asyncio.sleep(0)
+        return events, parse_times, bot.guilds
+    finally:
+        await bot.close()
+
+
+def test_record_and_replay(tmp_path):
+    path = os.path.join(tmp_path, "events.jsonl.gz")
+    assert asyncio.run(record(path)) == 4
+
+    events, parse_times, guilds = asyncio.run(replay_recording(path))
+    assert [event for _, event, _ in events] == [
+        "RECORDING", "READY", "GUILD_CREATE", "MESSAGE_CREATE",
+        "MESSAGE_DELETE"]
+
+    recorded = json.dumps(events)
+    for secret in (GUILD_ID, USER_ID, "someone", "private", "secret"):
+        assert secret not in recorded
+
+    for event in ("READY", "GUILD_CREATE", "MESSAGE_CREATE", "MESSAGE_DELETE"):
+        assert parse_times[event].calls == 1
+        assert parse_times[event].errors == 0
+    assert len(guilds) == 1
@@ -0,0 +1,37 @@
+"""Custom tag lookups across a guild's namespace and the global one."""
+import asyncio
+
+from benchmarks.fakes import FakeBot
+from utils.namespaces import GLOBAL
+import cogs.tag
+
+GUILD_ID = 1234
+
+
+def test_overridden_global_tag_is_hidden_behind_its_aliases(
+        tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def test():
+        cog = cogs.tag.CommandsTag(FakeBot())
+        cog.auto_db_save.cancel()
+        try:
+            cog.set_tag(
+                cog.namespaces.get(GLOBAL), "hosting", "Global hosting",
+                ["host setup"])
+            cog.set_tag(
+                cog.namespaces.get(GLOBAL), "latency", "Global latency", [])
+            cog.set_tag(
+                cog.namespaces.get(GUILD_ID), "hosting", "Guild hosting", [])
+
+            assert cog.get_custom_tag_responses(
+                "host setup", GUILD_ID) == []
+            assert cog.get_custom_tag_responses(
+                "hosting and latency", GUILD_ID) == [
+                    "Guild hosting", "Global latency"]
+            assert cog.get_custom_tag_responses("host setup") == [
+                "Global hosting"]
+        finally:
+            await cog.cog_unload()
+
+    asyncio.run(test())
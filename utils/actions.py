@@ -0,0 +1,226 @@
+from collections import deque
+import itertools
+import datetime
+import logging
+import asyncio
+import heapq
+import time
+
+import discord
+
+
+PUNISH, DELETE, WARN = range(3)  # priorities, lower runs first
+ROUTE_LIMITS = {  # calls per seconds, for each guild
+    "kick": (5, 5),
+    "timeout": (5, 5),
+    "delete": (5, 5),
+    "warn": (5, 5)}
+
+
+class RateBucket:
+    """Token bucket allowing `rate` calls every `per` seconds."""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate,
+                self.tokens + (now - self.updated) * self.rate / self.per)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class Action:
+    """A queued moderation API call, coalesced with others of the same key."""
+
+    __slots__ = ("priority", "route", "key", "target", "args", "enqueued_at")
+
+    def __init__(self, priority, route, key, target, *args):
+        self.priority = priority
+        self.route = route
+        self.key = key
+        self.target = target
+        self.args = args
+        self.enqueued_at = time.monotonic()
+
+
+class GuildQueue:
+    """A guild's queued actions, coalesced by key as they're enqueued.
+
+    The heap only holds one entry per key, ordered by the priority and
+    position of the key's first action, and the actions themselves wait in
+    a list per key. Taking a batch is then a heap pop and a dict pop.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.pending = {}  # key: actions in the order they were enqueued
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, action: Action, sequence: int):
+        batch = self.pending.get(action.key)
+        if batch is None:
+            self.pending[action.key] = [action]
+            heapq.heappush(self.heap, (action.priority, sequence, action.key))
+        else:
+            batch.append(action)
+        self.size += 1
+
+    def pop(self):
+        """Take the next key's actions out of the queue."""
+        _, _, key = heapq.heappop(self.heap)
+        batch = self.pending.pop(key)
+        self.size -= len(batch)
+        return batch
+
+
+class ActionQueue:
+    """Moderation actions run in the background, per guild and by priority.
+
+    Handlers enqueue and return immediately. Each guild gets its own worker
+    so one raid can't hold up moderation elsewhere, and calls are paced with
+    a token bucket per guild and route. Kicks and timeouts run before
+    deletions, which run before warnings. Queued deletions in a channel are
+    merged into one bulk delete, and identical warnings in a channel into
+    one message mentioning every member.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.workers = {}
+        self.buckets = {}
+        self.sequence = itertools.count()
+        self.latencies = deque(maxlen=1000)
+
+    def kick(self, member: discord.Member, reason: str):
+        self.put(member.guild, Action(
+            PUNISH, "kick", ("kick", member.id), member, reason))
+
+    def timeout(
+        self, member: discord.Member, duration: datetime.timedelta, reason: str
+    ):
+        self.put(member.guild, Action(
+            PUNISH, "timeout", ("timeout", member.id), member,
+            duration, reason))
+
+    def delete(self, message: discord.PartialMessage):
+        self.put(message.guild, Action(
+            DELETE, "delete", ("delete", message.channel.id), message))
+
+    def warn(
+        self,
+        channel: discord.TextChannel,
+        member: discord.Member,
+        text: str,
+        delete_after: float = None
+    ):
+        """Post a warning mentioning the member, merged with identical ones."""
+        self.put(channel.guild, Action(
+            WARN, "warn", ("warn", channel.id, text), member,
+            channel, text, delete_after))
+
+    def put(self, guild: discord.Guild, action: Action):
+        queue = self.queues.get(guild.id)
+        if queue is None:
+            queue = self.queues[guild.id] = GuildQueue()
+        queue.push(action, next(self.sequence))
+
+        if guild.id not in self.workers:
+            self.workers[guild.id] = asyncio.create_task(self.work(guild.id))
+
+    async def work(self, guild_id: int):
+        """Run a guild's queued actions until there are none left."""
+        queue = self.queues[guild_id]
+
+        try:
+            while queue:
+                batch = queue.pop()
+                action = batch[0]
+
+                bucket = self.buckets.get((guild_id, action.route))
+                if not bucket:
+                    bucket = RateBucket(*ROUTE_LIMITS[action.route])
+                    self.buckets[guild_id, action.route] = bucket
+                await bucket.acquire()
+
+                try:
+                    await getattr(self, f"run_{action.route}")(batch)
+                except discord.HTTPException as e:
+                    logging.warning(
+                        f"Moderation action {action.route} failed "
+                        f"[{type(e).__name__}]: {e}")
+                except Exception:
+                    # Keep draining the queue, as nothing awaits this task
+                    logging.exception(
+                        f"Moderation action {action.route} failed")
+
+                now = time.monotonic()
+                self.latencies.extend(now - a.enqueued_at for a in batch)
+        finally:
+            del self.workers[guild_id]
+            if not queue:
+                del self.queues[guild_id]
+
+    async def run_kick(self, batch: list):
+        await batch[0].target.kick(reason=batch[0].args[0])
+
+    async def run_timeout(self, batch: list):
+        duration, reason = batch[0].args
+        await batch[0].target.timeout(duration, reason=reason)
+
+    async def run_delete(self, batch: list):
+        channel = batch[0].target.channel
+        messages = list({a.target.id: a.target for a in batch}.values())
+
+        for message in messages[100:]:  # bulk deletion limit
+            self.delete(message)
+        messages = messages[:100]
+
+        try:
+            if len(messages) == 1:
+                await messages[0].delete()
+            else:
+                await channel.delete_messages(messages)
+        except discord.NotFound:
+            pass
+
+    async def run_warn(self, batch: list):
+        channel, text, delete_after = batch[0].args
+        members = list({a.target.id: a.target for a in batch}.values())
+        mentions = " ".join(member.mention for member in members)
+
+        await channel.send(
+            f"{mentions} {text}",
+            allowed_mentions=discord.AllowedMentions(users=members),
+            delete_after=delete_after)
+
+    def stats(self):
+        """Current queue depth and recent enqueue-to-completion latency."""
+        latencies = self.latencies or [0]
+        return {
+            "depth": sum(map(len, self.queues.values())),
+            "latency_mean": sum(latencies) / len(latencies),
+            "latency_max": max(latencies)}
+
+    async def close(self, timeout: float = 10):
+        """Give queued actions some time to finish, then cancel the rest."""
+        workers = list(self.workers.values())
+        if not workers:
+            return
+
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
@@ -0,0 +1,120 @@
+from collections import Counter, deque
+import datetime
+import logging
+import asyncio
+
+import discord
+
+
+MODERATION_ACTIONS = (
+    discord.AuditLogAction.ban,             # ban auto bulk deletion
+    discord.AuditLogAction.message_delete,  # human moderator action
+    discord.AuditLogAction.kick,            # bot action
+    discord.AuditLogAction.member_update)   # bot action (timeout)
+
+
+class GuildAuditLog:
+    """Sliding window of moderation actions in one guild, by target."""
+
+    __slots__ = ("entries", "targets", "ready", "backfill")
+
+    def __init__(self):
+        self.entries = deque()
+        self.targets = Counter()
+        self.ready = False
+        self.backfill = None
+
+    def add(self, created_at: datetime.datetime, target_id: int):
+        self.entries.append((created_at, target_id))
+        self.targets[target_id] += 1
+
+    def prune(self, oldest: datetime.datetime):
+        while self.entries and self.entries[0][0] < oldest:
+            _, target_id = self.entries.popleft()
+            self.targets[target_id] -= 1
+            if not self.targets[target_id]:
+                del self.targets[target_id]
+
+
+class AuditLogCache:
+    """Recent moderation audit log entries per guild, fed by gateway events.
+
+    A guild is backfilled with a single audit log fetch the first time it
+    is queried (or after a new gateway session, when events may have been
+    missed). Concurrent queries wait on that same fetch, after which every
+    query is answered from memory.
+    """
+
+    def __init__(self, window: datetime.timedelta):
+        self.window = window
+        self.guilds = {}
+
+    def guild_log(self, guild_id: int):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = GuildAuditLog()
+        return self.guilds[guild_id]
+
+    def add(self, entry: discord.AuditLogEntry):
+        """Record an audit log entry if it's a relevant moderation action."""
+        if entry.action not in MODERATION_ACTIONS or entry.target is None:
+            return
+
+        # Pruned here too, as guilds that are never queried would keep
+        # every entry otherwise
+        guild_log = self.guild_log(entry.guild.id)
+        guild_log.add(entry.created_at, entry.target.id)
+        guild_log.prune(discord.utils.utcnow() - self.window)
+
+    def forget(self, guild_id: int):
+        """Drop a guild's entries, e.g. once the bot left it."""
+        self.guilds.pop(guild_id, None)
+
+    def dump(self):
+        """Entries of every guild that's known to be complete."""
+        return {
+            guild_id: list(guild_log.entries)
+            for guild_id, guild_log in self.guilds.items()
+            if guild_log.ready}
+
+    def restore(self, guilds: dict):
+        """Add entries from `dump`, trusting them to be complete."""
+        for guild_id, entries in guilds.items():
+            guild_log = self.guild_log(guild_id)
+            for created_at, target_id in entries:
+                guild_log.add(created_at, target_id)
+            guild_log.entries = deque(sorted(guild_log.entries))
+            guild_log.ready = True
+
+    def invalidate(self):
+        """Require a backfill again, as events may have been missed."""
+        for guild_log in self.guilds.values():
+            guild_log.ready = False
+
+    async def contains(self, guild: discord.Guild, target_id: int):
+        """Whether a recent moderation action in the guild targeted the ID."""
+        guild_log = self.guild_log(guild.id)
+
+        if not guild_log.ready:
+            if not guild_log.backfill:
+                guild_log.backfill = asyncio.create_task(
+                    self.backfill(guild, guild_log))
+            await asyncio.shield(guild_log.backfill)
+
+        guild_log.prune(discord.utils.utcnow() - self.window)
+        return target_id in guild_log.targets
+
+    async def backfill(self, guild: discord.Guild, guild_log: GuildAuditLog):
+        """Fetch the entries in the window that events may not have covered."""
+        after = discord.utils.utcnow() - self.window
+
+        try:
+            async for entry in guild.audit_logs(after=after):
+                self.add(entry)
+            # Events may have arrived while fetching, so restore the order
+            guild_log.entries = deque(sorted(guild_log.entries))
+            guild_log.ready = True
+        except discord.HTTPException as e:
+            logging.warning(
+                f"Couldn't fetch audit log of {guild} [{type(e).__name__}]")
+        finally:
+            guild_log.backfill = None
@@ -0,0 +1,139 @@
+from bisect import bisect_left, insort
+import heapq
+
+from discord import app_commands
+
+
+KINDS = ("tag", "code", "article")
+
+
+def trigrams(text: str):
+    """Get the set of three character slices of some text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Entry:
+    """A single autocomplete suggestion along with what it is found by."""
+
+    __slots__ = ("kind", "choice", "text", "order", "keys")
+
+    def __init__(self, kind, choice, order, keys):
+        self.kind = kind
+        self.choice = choice
+        self.text = choice.name.lower()
+        self.order = order
+        self.keys = keys
+
+
+class AutocompleteIndex:
+    """Ranked, incrementally updated autocomplete for tags, codes and articles.
+
+    Choices are built once when an entry is added. Lookups rank an exact
+    code first, then names starting with the input (from a sorted key list
+    per kind, which works as a flattened prefix trie), then names containing
+    it (narrowed down through a trigram index), and stop at the limit.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.ordered = []
+        self.prefixes = {kind: [] for kind in KINDS}
+        self.grams = {}
+        self.sequence = 0
+
+    def add_tag(self, name: str, aliases: list):
+        """Add or replace a custom tag, searchable by its aliases too."""
+        if aliases:
+            display = f"{name} (aliases: {', '.join(aliases)})"
+        else:
+            display = name
+
+        self.add("tag", name, display, keys=[name] + aliases, order=name)
+
+    def add(self, kind, value, display=None, *, keys=None, order=None):
+        """Add or replace an entry, by default named and found by its value."""
+        self.remove(kind, value)
+
+        if order is None:
+            self.sequence += 1
+            order = self.sequence
+
+        choice = app_commands.Choice(name=(display or value)[:99], value=value)
+        keys = {key.lower() for key in keys or [value] if key}
+        entry = Entry(kind, choice, (KINDS.index(kind), order), keys)
+        self.entries[kind, value] = entry
+
+        insort(self.ordered, (entry.order, value))
+        for key in keys:
+            insort(self.prefixes[kind], (key, value))
+        for gram in trigrams(entry.text):
+            self.grams.setdefault(gram, set()).add((kind, value))
+
+    def remove(self, kind, value):
+        """Remove an entry if it exists."""
+        entry = self.entries.pop((kind, value), None)
+        if not entry:
+            return
+
+        del self.ordered[bisect_left(self.ordered, (entry.order, value))]
+        for key in entry.keys:
+            prefixes = self.prefixes[kind]
+            del prefixes[bisect_left(prefixes, (key, value))]
+        for gram in trigrams(entry.text):
+            self.grams[gram].discard((kind, value))
+            if not self.grams[gram]:
+                del self.grams[gram]
+
+    def search(self, current: str, *, kinds=KINDS, limit=25):
+        """Get up to `limit` best ranked choices for the given input."""
+        query = current.lower().strip()
+        found = {}
+
+        exact = self.entries.get(("code", current.strip()))
+        if "code" in kinds and exact:
+            found["code", exact.choice.value] = exact
+
+        for kind in kinds if query else ():
+            prefixes = self.prefixes[kind]
+            index = bisect_left(prefixes, (query,))
+            while len(found) < limit and index < len(prefixes):
+                key, value = prefixes[index]
+                if not key.startswith(query):
+                    break
+                found.setdefault((kind, value), self.entries[kind, value])
+                index += 1
+
+        if len(found) < limit:
+            for entry in self.contains(current.lower(), kinds, found, limit):
+                found[entry.kind, entry.choice.value] = entry
+
+        return [entry.choice for entry in found.values()]
+
+    def contains(self, query: str, kinds, exclude, limit: int):
+        """Get entries containing the query, in kind and name order."""
+        remaining = limit - len(exclude)
+
+        if len(query) < 3:
+            results = []
+            for order, value in self.ordered:
+                kind = KINDS[order[0]]
+                if kind not in kinds or (kind, value) in exclude:
+                    continue
+                entry = self.entries[kind, value]
+                if query in entry.text:
+                    results.append(entry)
+                    if len(results) == remaining:
+                        break
+            return results
+
+        candidates = sorted(
+            (self.grams.get(gram, set()) for gram in trigrams(query)), key=len)
+        candidates = set.intersection(*candidates)
+
+        return heapq.nsmallest(
+            remaining,
+            (
+                self.entries[key] for key in candidates
+                if key[0] in kinds and key not in exclude
+                and query in self.entries[key].text),
+            key=lambda entry: entry.order)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+
+class VersionedLRU:
+    """Least recently used cache, emptied whenever its version moves.
+
+    Callers read `version` before computing a value and pass it back to
+    `set`, so a value computed from data that changed in the meantime is
+    thrown away instead of being served later.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        value = self.entries.get(key, default)
+        if value is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, version: int):
+        if version != self.version:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def bump(self):
+        """Invalidate everything cached so far."""
+        self.version += 1
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses}
@@ -0,0 +1,52 @@
+import string
+
+
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation.replace("-", ""))
+
+
+class CodeIndex:
+    """Lookup table from query words to rendered error code responses.
+
+    Each code is reachable by both its signed and its dash-less form, and
+    remembers its rank in decreasing magnitude order so matches come out
+    sorted the same way the full code table would be.
+    """
+
+    def __init__(self, codes: dict):
+        self.entries = {}
+
+        codes_sorted_decreasing_and_signless = sorted(
+            codes.items(), key=lambda i: abs(int(i[0])), reverse=True)
+
+        for rank, (code, details) in enumerate(
+                codes_sorted_decreasing_and_signless):
+            signless = code.replace("-", "")
+            entry = (rank, self.render(code, details), len(signless) == 1)
+
+            for word in {code, signless}:
+                self.entries.setdefault(word, []).append(entry)
+
+    @staticmethod
+    def render(code: str, details: dict):
+        """Build the response block shown for a single error code."""
+        header_title = details["title"] or details["desc"]
+        code_response = [f"## Error Code [{code}] {header_title}"]
+
+        if details["title"]:
+            code_response.append(details["desc"])
+        if "support.parsec.app" in details["url"]:
+            code_response.append(
+                f"[**Read the article for more details**]"
+                f"(<{details['url']}>)")
+
+        return "\n".join(code_response)
+
+    def find(self, query: str, *, ignore_single_digits: bool = False):
+        """Get responses for every code written as a word in the query."""
+        matched = set()
+        for word in set(query.translate(PUNCTUATION_TABLE).split()):
+            matched.update(self.entries.get(word, ()))
+
+        return [
+            response for _, response, single_digit in sorted(matched)
+            if not (ignore_single_digits and single_digit)]
@@ -0,0 +1,129 @@
+import logging
+import asyncio
+import hmac
+import json
+import os
+
+from discord.ext import commands
+
+TOKEN_VARIABLE = "GOLEM_COORDINATOR_TOKEN"  # passed to workers by launcher.py
+AUTHENTICATION_TIMEOUT = 5  # seconds
+
+
+class Coordinator:
+    """Local relay between bot worker processes of one sharded instance.
+
+    Workers connect over localhost and publish JSON lines, which are sent on
+    to every other connected worker. Any local process can connect, so a
+    connection has to send the shared token as its first line before it's
+    relayed anything, or allowed to publish.
+    """
+
+    def __init__(self, port: int, token: str):
+        self.port = port
+        self.token = token.encode()
+        self.writers = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_worker, "127.0.0.1", self.port)
+
+    async def authenticate(self, reader):
+        try:
+            line = await asyncio.wait_for(
+                reader.readline(), AUTHENTICATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return hmac.compare_digest(line.rstrip(b"\n"), self.token)
+
+    async def handle_worker(self, reader, writer):
+        try:
+            if not await self.authenticate(reader):
+                logging.warning("Rejected a coordinator connection")
+                return
+
+            self.writers.add(writer)
+            while line := await reader.readline():
+                for other in self.writers - {writer}:
+                    other.write(line)
+                    await other.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def close(self):
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class CoordinatorClient:
+    """Worker side of the coordinator, turning messages into bot events.
+
+    A message published as `publish("tag_edit", name="dog")` by one worker
+    is dispatched as `on_coordinator_tag_edit({"name": "dog"})` in the
+    others, so cogs can handle it like any other event.
+    """
+
+    def __init__(self, bot: commands.Bot, port: int, token: str = None):
+        self.bot = bot
+        self.port = port
+        self.token = token or os.environ.get(TOKEN_VARIABLE, "")
+        self.writer = None
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        """Keep a connection to the coordinator, reconnecting if it drops."""
+        delay = 1
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(
+                    "127.0.0.1", self.port)
+                writer.write(self.token.encode() + b"\n")
+                self.writer = writer
+                delay = 1
+
+                while line := await reader.readline():
+                    try:
+                        message = json.loads(line)
+                        event, data = message["event"], message["data"]
+                    except (ValueError, KeyError, TypeError) as e:
+                        logging.warning(
+                            "Ignoring malformed coordinator message "
+                            f"[{type(e).__name__}]")
+                        continue
+
+                    self.bot.dispatch(f"coordinator_{event}", data)
+            except OSError as e:
+                logging.warning(
+                    f"Coordinator connection lost [{type(e).__name__}]")
+            except Exception:
+                logging.exception("Coordinator listener failed")
+            finally:
+                self.writer = None
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def publish(self, event: str, **data):
+        """Send an event to every other worker process."""
+        if not self.writer:
+            logging.warning(f"Not connected to coordinator to send {event}")
+            return
+
+        self.writer.write(
+            json.dumps({"event": event, "data": data}).encode() + b"\n")
+        await self.writer.drain()
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.writer:
+            self.writer.close()
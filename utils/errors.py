@@ -0,0 +1,100 @@
+from collections import Counter
+import traceback
+import datetime
+import hashlib
+import os
+
+import discord
+
+MAX_DIGEST_LENGTH = 2000  # Discord message limit
+
+
+def fingerprint(error: BaseException):
+    """Identify an error by its type and the functions it went through.
+
+    Line numbers and messages are left out, so the same failure with
+    different details or after a small edit still counts as one.
+    """
+    frames = traceback.extract_tb(error.__traceback__)
+    parts = [type(error).__qualname__] + [
+        f"{os.path.basename(frame.filename)}:{frame.name}"
+        for frame in frames]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:12]
+
+
+class ErrorDigest:
+    """Occurrences of one kind of error within a window."""
+
+    __slots__ = (
+        "summary", "details", "started", "count", "reported",
+        "commands", "guilds")
+
+    def __init__(self, summary: str, details: str):
+        self.summary = summary
+        self.details = details
+        self.started = discord.utils.utcnow()
+        self.count = 0
+        self.reported = 0
+        self.commands = Counter()
+        self.guilds = Counter()
+
+    def render(self, fingerprint: str):
+        """The owner message, trimmed to fit Discord's length limit."""
+        def listed(counter: Counter):
+            return ", ".join(
+                f"{name} ({count})" for name, count in counter.most_common(5))
+
+        header = (
+            f"**{self.summary}** `{fingerprint}`\n"
+            f"{self.count - self.reported} time(s) since "
+            f"{discord.utils.format_dt(self.started, style='t')}"
+            f" ({self.count} in total)\n"
+            f"commands: {listed(self.commands)}\n"
+            f"guilds: {listed(self.guilds)}\n")
+
+        if self.reported:  # traceback was in the first report already
+            return header
+
+        room = MAX_DIGEST_LENGTH - len(header) - len("```py\n```")
+        return f"{header}```py\n{self.details[-room:]}```"
+
+
+class ErrorDigests:
+    """Group errors by fingerprint, to report each kind once per window.
+
+    A new kind of error is reported with its traceback the next time
+    `pop_reports` is called, then further occurrences are only counted,
+    and reported together when its window is over.
+    """
+
+    def __init__(self, window: datetime.timedelta):
+        self.window = window
+        self.digests = {}
+
+    def add(self, error: BaseException, command: str, guild: str):
+        key = fingerprint(error)
+        if key not in self.digests:
+            self.digests[key] = ErrorDigest(
+                f"{type(error).__name__}: {error}"[:200],
+                "".join(traceback.format_exception(error)))
+
+        digest = self.digests[key]
+        digest.count += 1
+        digest.commands[command] += 1
+        digest.guilds[guild] += 1
+
+    def pop_reports(self):
+        """Messages due to be sent to the owner, expiring old windows."""
+        now = discord.utils.utcnow()
+        reports = []
+
+        for key, digest in list(self.digests.items()):
+            if digest.count > digest.reported and (
+                    not digest.reported or now - digest.started > self.window):
+                reports.append(digest.render(key))
+                digest.reported = digest.count
+
+            if now - digest.started > self.window:
+                del self.digests[key]
+
+        return reports
@@ -0,0 +1,180 @@
+from collections import OrderedDict, deque
+import datetime
+import time
+import sys
+
+import discord
+
+
+class MessageRecord:
+    """The parts of a message needed to compare it with a later one."""
+
+    __slots__ = ("id", "channel_id", "created_at", "length", "content")
+
+    def __init__(self, message: discord.Message):
+        self.id = message.id
+        self.channel_id = message.channel.id
+        self.created_at = message.created_at
+        self.length = len(message.content)
+        self.content = message.content
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.content)
+
+
+class RecentMessage:
+    """The parts of a message needed to report it once it's deleted."""
+
+    __slots__ = (
+        "id", "channel_id", "author_id", "created_at", "mention_ids",
+        "content")
+
+    def __init__(self, message: discord.Message):
+        self.id = message.id
+        self.channel_id = message.channel.id
+        self.author_id = message.author.id
+        self.created_at = message.created_at
+        self.mention_ids = tuple(user.id for user in message.mentions)
+        self.content = message.clean_content
+
+    def __sizeof__(self):
+        return (
+            object.__sizeof__(self) + sys.getsizeof(self.content)
+            + sys.getsizeof(self.mention_ids))
+
+
+class RecentMessages:
+    """Ring buffer of recent messages per channel, indexed by message ID.
+
+    Each channel keeps at most `per_channel` messages younger than `window`,
+    and only the `max_channels` channels written to most recently are kept,
+    so memory stays bounded however busy or numerous channels are.
+    """
+
+    def __init__(
+        self, per_channel: int, max_channels: int, window: datetime.timedelta
+    ):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self.window = window
+        self.channels = OrderedDict()  # channel ID: deque of records
+        self.messages = {}  # message ID: record
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, record: RecentMessage):
+        channel = self.channels.get(record.channel_id)
+        if channel is None:
+            channel = self.channels[record.channel_id] = deque()
+            if len(self.channels) > self.max_channels:
+                _, oldest = self.channels.popitem(last=False)
+                for old in oldest:
+                    self.forget(old)
+        self.channels.move_to_end(record.channel_id)
+
+        oldest_allowed = record.created_at - self.window
+        while channel and (
+                len(channel) >= self.per_channel
+                or channel[0].created_at < oldest_allowed):
+            self.forget(channel.popleft())
+
+        channel.append(record)
+        self.messages[record.id] = record
+
+    def forget(self, record: RecentMessage):
+        if self.messages.get(record.id) is record:
+            del self.messages[record.id]
+
+    def pop(self, message_id: int):
+        """Take out a message if it's known, e.g. once it's deleted.
+
+        The record stays in its channel's buffer until pushed out, but it
+        can't be found anymore.
+        """
+        return self.messages.pop(message_id, None)
+
+    def dump(self):
+        return list(self.messages.values())
+
+    def restore(self, records: list):
+        for record in sorted(records, key=lambda record: record.created_at):
+            self.add(record)
+
+    def memory_usage(self):
+        """Approximate size of the buffers and their records in bytes."""
+        return (
+            sys.getsizeof(self.channels) + sys.getsizeof(self.messages)
+            + sum(map(sys.getsizeof, self.channels.values()))
+            + sum(map(sys.getsizeof, self.messages.values())))
+
+
+class ExpiringStore:
+    """Mapping bounded by size and age, evicting the oldest writes first.
+
+    Every write refreshes an entry's age, so the oldest entry is always at
+    the front and expired entries are dropped in passing without scanning.
+    """
+
+    def __init__(self, max_size: int, ttl: datetime.timedelta):
+        self.max_size = max_size
+        self.ttl = ttl.total_seconds()
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        self.prune()
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value=True):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        self.prune()
+
+    def pop(self, key, default=None):
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def prune(self):
+        """Drop expired entries, then the oldest ones if over the limit."""
+        now = time.monotonic()
+        while self.entries and next(iter(self.entries.values()))[0] < now:
+            self.entries.popitem(last=False)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def dump(self):
+        """Entries with their remaining lifetime, oldest first.
+
+        Lifetimes are relative, so they stay right when restored in another
+        process, whose monotonic clock may have another starting point.
+        """
+        self.prune()
+        now = time.monotonic()
+        return [
+            (key, expires - now, value)
+            for key, (expires, value) in self.entries.items()]
+
+    def restore(self, entries: list):
+        """Add entries from `dump`, keeping what they had left to live."""
+        now = time.monotonic()
+        for key, remaining, value in entries:
+            self.entries[key] = (now + remaining, value)
+            self.entries.move_to_end(key)
+        self.prune()
+
+    def memory_usage(self):
+        """Approximate size of the store and its values in bytes."""
+        return sys.getsizeof(self.entries) + sum(
+            sys.getsizeof(entry) + sys.getsizeof(entry[1])
+            for entry in self.entries.values())
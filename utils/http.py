@@ -0,0 +1,78 @@
+import logging
+import asyncio
+import random
+
+import aiohttp
+
+
+class ConditionalFetcher:
+    """Pooled HTTP client that only downloads resources when they changed.
+
+    ETag and Last-Modified validators are remembered per URL once a response
+    was handled successfully, so unchanged resources come back as a 304 and
+    are skipped entirely. Connection errors, timeouts and server errors are
+    retried with exponential backoff and full jitter.
+    """
+
+    def __init__(self, *, retries: int = 3, backoff: float = 2.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.validators = {}
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4),
+            timeout=aiohttp.ClientTimeout(total=60))
+
+    async def fetch(self, url: str, handler):
+        """Pass a changed resource to the handler and return what it returns.
+
+        Returns None if the resource didn't change, or if it couldn't be
+        fetched or handled, in which case the error is logged.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** attempt
+                await asyncio.sleep(random.uniform(0, delay))
+
+            try:
+                async with self.session.get(
+                        url, headers=self.validators.get(url, {})) as resp:
+                    if resp.status == 304:
+                        return None
+                    if resp.status == 429 or resp.status >= 500:
+                        logging.warning(f"Fetching {url} gave {resp.status}")
+                        continue
+                    if resp.status != 200:
+                        logging.error(f"Fetching {url} gave {resp.status}")
+                        return None
+
+                    result = await self.handle(url, resp, handler)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Fetching {url} failed [{type(e).__name__}]")
+                continue
+
+            return result
+
+        logging.error(f"Giving up fetching {url} after {attempt + 1} tries")
+        return None
+
+    async def handle(self, url: str, resp: aiohttp.ClientResponse, handler):
+        """Run the handler, remembering validators only if it succeeds."""
+        try:
+            result = await handler(resp)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raise
+        except Exception:
+            logging.exception(f"Couldn't handle response from {url}")
+            return None
+
+        validators = {}
+        if "ETag" in resp.headers:
+            validators["If-None-Match"] = resp.headers["ETag"]
+        if "Last-Modified" in resp.headers:
+            validators["If-Modified-Since"] = resp.headers["Last-Modified"]
+
+        self.validators[url] = validators
+        return result
+
+    async def close(self):
+        await self.session.close()
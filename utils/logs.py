@@ -0,0 +1,108 @@
+from logging.handlers import QueueHandler, QueueListener
+import datetime
+import logging
+import atexit
+import queue
+import json
+import sys
+
+FORMAT = "%(asctime)s %(levelname)-8s %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed with `extra`."""
+
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()}
+
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES)
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every N records of each sampled category.
+
+    Categories come from `extra={"category": ...}`. Warnings and errors are
+    always kept, as are records without a sampled category.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self.counts = dict.fromkeys(rates, 0)
+
+    def filter(self, record: logging.LogRecord):
+        category = getattr(record, "category", None)
+        if record.levelno >= logging.WARNING or category not in self.rates:
+            return True
+
+        self.counts[category] += 1
+        return (self.counts[category] - 1) % self.rates[category] == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records with their message merged, for the listener to format.
+
+    Arguments are often live discord objects, which the event loop may
+    change before the listener thread gets to them, so the message is
+    merged here. Timestamps, JSON and tracebacks are still formatted by the
+    listener, and the record isn't copied, as the queue stays in this
+    process.
+    """
+
+    def prepare(self, record: logging.LogRecord):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(*, json_lines: bool = False, sampling: dict = None):
+    """Log through a queue, so formatting and writing happen off the loop.
+
+    :param json_lines: Write JSON objects instead of plain text lines
+    :param sampling: How many records of a category to log one out of
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(
+        JsonFormatter() if json_lines
+        else logging.Formatter(FORMAT, DATE_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(records)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(logging.INFO)
+
+    for logger in logging.root.manager.loggerDict:
+        logging.getLogger(logger).setLevel(logging.WARNING)
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    queue_handler.listener = listener
+    return listener
+
+
+def stop_logging():
+    """Write out every queued record, for exits that skip `atexit`."""
+    for handler in logging.getLogger().handlers:
+        if listener := getattr(handler, "listener", None):
+            listener.stop()
+            atexit.unregister(listener.stop)
+            handler.listener = None
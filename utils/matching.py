@@ -0,0 +1,69 @@
+from collections import deque
+
+
+class TagMatcher:
+    """Aho-Corasick automaton over every custom tag name and alias.
+
+    Finds all tags mentioned in a query with a single pass over it, instead
+    of testing each name against the query separately.
+    """
+
+    def __init__(self, db: dict):
+        self.names = list(db)
+        self.always = set()  # tags with an empty alias match anything
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+
+        for index, (main_tag_name, value) in enumerate(db.items()):
+            for name in [main_tag_name] + value["aliases"]:
+                if name:
+                    self.insert(name, index)
+                else:
+                    self.always.add(index)
+
+        self.link()
+
+    def insert(self, name: str, index: int):
+        """Add a pattern to the trie, recording which tag it belongs to."""
+        node = 0
+        for character in name:
+            next_node = self.goto[node].get(character)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][character] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            node = next_node
+
+        self.output[node].add(index)
+
+    def link(self):
+        """Compute failure links breadth-first and merge their outputs."""
+        queue = deque(self.goto[0].values())
+
+        while queue:
+            node = queue.popleft()
+            for character, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(character, 0)
+                self.output[child] |= self.output[self.fail[child]]
+
+    def find(self, query: str):
+        """Get main names of the tags found in the query, in database order."""
+        goto, fail, output = self.goto, self.fail, self.output
+        matched = set(self.always)
+        node = 0
+
+        for character in query.lower():
+            while node and character not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(character, 0)
+            if output[node]:
+                matched |= output[node]
+
+        return [self.names[index] for index in sorted(matched)]
@@ -0,0 +1,37 @@
+from types import FunctionType, ModuleType
+import gc
+import sys
+
+from discord.http import HTTPClient
+from discord.state import ConnectionState
+import discord
+
+
+SHARED_TYPES = (  # owned by the client itself, not by what refers to them
+    type, ModuleType, FunctionType,
+    discord.Client, ConnectionState, HTTPClient,
+    discord.Guild, discord.abc.GuildChannel, discord.Thread,
+    discord.abc.PrivateChannel, discord.User, discord.ClientUser,
+    discord.Role, discord.Emoji)
+
+
+def deep_sizeof(obj, exclude: tuple = SHARED_TYPES):
+    """Approximate bytes used by an object and everything only it refers to.
+
+    Objects shared with the rest of the client, like guilds and channels,
+    are not followed, so a message doesn't count the whole client.
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+
+    while pending:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, exclude):
+            continue
+
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        pending.extend(gc.get_referents(current))
+
+    return size
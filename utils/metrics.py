@@ -0,0 +1,211 @@
+from collections import defaultdict, deque
+import functools
+import logging
+import asyncio
+import time
+
+from aiohttp import web
+from discord import app_commands
+from discord.ext import commands
+import discord
+
+
+SAMPLES = 2048  # latest durations kept for each histogram
+QUANTILES = (0.5, 0.95, 0.99)
+LAG_INTERVAL = 0.5  # seconds between event loop lag measurements
+
+
+class Histogram:
+    """Rolling window of recent durations, with call and error totals."""
+
+    __slots__ = ("samples", "calls", "errors", "total")
+
+    def __init__(self):
+        self.samples = deque(maxlen=SAMPLES)
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, failed: bool = False):
+        self.samples.append(seconds)
+        self.calls += 1
+        self.errors += failed
+        self.total += seconds
+
+    def quantiles(self):
+        samples = sorted(self.samples) or [0]
+        return {
+            q: samples[min(len(samples) - 1, int(q * len(samples)))]
+            for q in QUANTILES}
+
+
+class Metrics:
+    """Latency histograms for handlers, REST calls and event loop lag.
+
+    Nothing here runs unless the bot is started with a metrics port: the
+    bot then calls `instrument_cog` and `instrument_commands` for every cog
+    it adds, which replace its listeners, app command callbacks and
+    autocomplete callbacks with timed wrappers, and `start` wraps the HTTP
+    client's requests. Results
+    are served as Prometheus text on localhost, and shown by `/owner stats`.
+    """
+
+    def __init__(self, bot: commands.Bot, port: int = None):
+        self.bot = bot
+        self.port = port
+        self.handlers = defaultdict(Histogram)  # (kind, name): Histogram
+        self.requests = defaultdict(Histogram)  # (method, path): Histogram
+        self.loop_lag = Histogram()
+        self.lag_task = None
+        self.runner = None
+
+    def timed(self, kind: str, name: str, callback):
+        """Wrap a coroutine function to record how long each call takes."""
+        if getattr(callback, "__metrics__", False):
+            return callback
+
+        histogram = self.handlers[kind, name]
+
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = await callback(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - start, failed)
+
+        wrapper.__metrics__ = True
+        return wrapper
+
+    def instrument_cog(self, cog: commands.Cog):
+        """Time the listeners of a cog that's about to be added."""
+        for _, method_name in cog.__cog_listeners__:
+            setattr(cog, method_name, self.timed(
+                "listener",
+                f"{cog.qualified_name}.{method_name}",
+                getattr(cog, method_name)))
+
+    def instrument_commands(self):
+        """Time every app command and autocomplete callback in the tree."""
+        commands_ = list(self.bot.tree.walk_commands())
+        commands_.extend(self.bot.tree.get_commands(
+            type=discord.AppCommandType.message))
+
+        for command in commands_:
+            if isinstance(command, app_commands.Group):
+                continue
+
+            command._callback = self.timed(
+                "command", command.qualified_name, command._callback)
+
+            for parameter in getattr(command, "_params", {}).values():
+                if parameter.autocomplete:
+                    parameter.autocomplete = self.timed(
+                        "autocomplete",
+                        f"{command.qualified_name}:{parameter.name}",
+                        parameter.autocomplete)
+
+    def instrument_http(self):
+        """Count and time every REST call, by method and route template."""
+        http = self.bot.http
+        request = http.request
+
+        @functools.wraps(request)
+        async def wrapper(route, **kwargs):
+            histogram = self.requests[route.method, route.path]
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = await request(route, **kwargs)
+                failed = False
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - start, failed)
+
+        http.request = wrapper
+
+    async def measure_loop_lag(self):
+        """Record how late the event loop wakes up from a short sleep."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag.observe(
+                max(0, time.perf_counter() - start - LAG_INTERVAL))
+
+    def cog_stats(self):
+        """Gauges from every cog that reports its own `stats`."""
+        return {
+            cog.qualified_name: cog.stats()
+            for cog in self.bot.cogs.values() if hasattr(cog, "stats")}
+
+    def render(self):
+        """Everything measured so far, in Prometheus text format."""
+        lines = [
+            "# TYPE golem_handler_seconds summary",
+            "# TYPE golem_handler_errors_total counter"]
+
+        for (kind, name), histogram in sorted(self.handlers.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            lines.extend(summary("golem_handler_seconds", labels, histogram))
+            lines.append(
+                f"golem_handler_errors_total{{{labels}}} {histogram.errors}")
+
+        lines.extend([
+            "# TYPE golem_rest_seconds summary",
+            "# TYPE golem_rest_errors_total counter"])
+
+        for (method, path), histogram in sorted(self.requests.items()):
+            labels = f'method="{method}",route="{path}"'
+            lines.extend(summary("golem_rest_seconds", labels, histogram))
+            lines.append(
+                f"golem_rest_errors_total{{{labels}}} {histogram.errors}")
+
+        lines.append("# TYPE golem_event_loop_lag_seconds summary")
+        lines.extend(
+            summary("golem_event_loop_lag_seconds", "", self.loop_lag))
+
+        lines.append("# TYPE golem_cog_stat gauge")
+        for cog, stats in self.cog_stats().items():
+            for key, value in stats.items():
+                lines.append(
+                    f'golem_cog_stat{{cog="{cog}",stat="{key}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, request: web.Request):
+        return web.Response(text=self.render(), content_type="text/plain")
+
+    async def start(self):
+        self.instrument_http()
+        self.lag_task = asyncio.create_task(self.measure_loop_lag())
+
+        if self.port is None:  # measured for something else, like a replay
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.serve)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+        logging.info(f"Serving metrics on http://127.0.0.1:{self.port}")
+
+    async def close(self):
+        if self.lag_task:
+            self.lag_task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+
+def summary(metric: str, labels: str, histogram: Histogram):
+    """Prometheus summary lines for one histogram."""
+    separator = "," if labels else ""
+    totals = f"{{{labels}}}" if labels else ""
+    lines = [
+        f'{metric}{{{labels}{separator}quantile="{q}"}} {value:.6f}'
+        for q, value in histogram.quantiles().items()]
+    lines.append(f"{metric}_count{totals} {histogram.calls}")
+    lines.append(f"{metric}_sum{totals} {histogram.total:.6f}")
+    return lines
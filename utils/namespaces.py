@@ -0,0 +1,104 @@
+from collections import OrderedDict
+
+from utils.autocomplete import AutocompleteIndex
+from utils.matching import TagMatcher
+from utils.tag_store import TagStore
+
+GLOBAL = 0  # guild ID of the tags shared by every guild
+
+
+class TagNamespace:
+    """Custom tags of one guild, or the global ones, with their indexes."""
+
+    __slots__ = ("guild_id", "db", "matcher", "autocomplete")
+
+    def __init__(self, guild_id: int, db: dict):
+        self.guild_id = guild_id
+        self.db = db
+        self.matcher = TagMatcher(db)
+        self.autocomplete = AutocompleteIndex()
+        for name, value in db.items():
+            self.autocomplete.add_tag(name, value["aliases"])
+
+    def __len__(self):
+        return len(self.db)
+
+    def resolve(self, name: str):
+        """Get the main name of a tag by its name or one of its aliases."""
+        for main_name, value in self.db.items():
+            if name == main_name or name in value["aliases"]:
+                return main_name
+        return None
+
+    def update(self, names: list):
+        """Refresh the matcher and autocomplete after tag edits."""
+        self.matcher = TagMatcher(self.db)
+
+        for name in names:
+            self.autocomplete.remove("tag", name)
+            if name in self.db:
+                self.autocomplete.add_tag(name, self.db[name]["aliases"])
+
+
+class TagNamespaces:
+    """Tag namespaces of each guild, loaded from the store on first use.
+
+    The global namespace is always loaded. Guild namespaces are unloaded,
+    least recently used first, once the loaded namespaces hold more than
+    `max_tags` tags between them (each counting as one more, so guilds
+    without tags are bounded too), and loaded again when next needed.
+    """
+
+    def __init__(self, store: TagStore, max_tags: int):
+        self.store = store
+        self.max_tags = max_tags
+        self.loaded = OrderedDict()
+        self.loaded[GLOBAL] = TagNamespace(GLOBAL, store.load(GLOBAL))
+
+    def __iter__(self):
+        return iter(list(self.loaded.values()))
+
+    def get(self, guild_id: int):
+        namespace = self.loaded.get(guild_id)
+        if namespace is None:
+            namespace = TagNamespace(guild_id, self.store.load(guild_id))
+            self.loaded[guild_id] = namespace
+            self.evict()
+
+        self.loaded.move_to_end(guild_id)
+        return namespace
+
+    def chain(self, guild_id: int = None):
+        """Namespaces used in a guild, its own first and then the global."""
+        if not guild_id:
+            return [self.loaded[GLOBAL]]
+        return [self.get(guild_id), self.loaded[GLOBAL]]
+
+    def evict(self):
+        total = sum(len(namespace) + 1 for namespace in self.loaded.values())
+        newest = next(reversed(self.loaded))
+
+        for guild_id in list(self.loaded):
+            if total <= self.max_tags:
+                break
+            if guild_id not in (GLOBAL, newest):
+                total -= len(self.loaded.pop(guild_id)) + 1
+
+    def reload(self, guild_id: int):
+        """Load a namespace again, after another process edited it.
+
+        Namespaces that aren't loaded are left alone, as they'll be read
+        fresh from the store when needed. Returns whether anything changed.
+        """
+        namespace = self.loaded.get(guild_id)
+        if namespace is None:
+            return False
+
+        db = self.store.load(guild_id)
+        changed = [
+            name for name in namespace.db.keys() | db.keys()
+            if namespace.db.get(name) != db.get(name)]
+
+        namespace.db = db
+        namespace.update(changed)
+        return bool(changed)
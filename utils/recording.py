@@ -0,0 +1,164 @@
+import hashlib
+import secrets
+import string
+import gzip
+import hmac
+import json
+import time
+import re
+
+RECORDED_EVENTS = {
+    "READY", "GUILD_CREATE", "GUILD_DELETE",
+    "GUILD_MEMBER_UPDATE", "GUILD_ROLE_CREATE", "GUILD_ROLE_UPDATE",
+    "GUILD_ROLE_DELETE", "CHANNEL_CREATE", "CHANNEL_DELETE",
+    "MESSAGE_CREATE", "MESSAGE_DELETE", "MESSAGE_DELETE_BULK",
+    "INTERACTION_CREATE", "GUILD_AUDIT_LOG_ENTRY_CREATE"}
+BLANKED_KEYS = {  # bulky or personal, and unused by the cogs
+    "members", "presences", "voice_states", "emojis", "stickers",
+    "guild_scheduled_events", "stage_instances", "soundboard_sounds",
+    "attachments", "embeds", "sticker_items", "reactions",
+    "referenced_message", "interaction_metadata", "interaction", "call",
+    "avatar", "banner", "avatar_decoration_data", "icon", "splash",
+    "discovery_splash", "description", "email", "bio", "topic",
+    "clan", "primary_guild", "collectibles", "session_id",
+    "resume_gateway_url", "private_channels", "relationships"}
+NAME_KEYS = {"username", "global_name", "nick"}
+TEXT_KEYS = {"content", "value", "reason"}
+SNOWFLAKE = re.compile(r"\d{15,20}")
+EVENT_NAME = re.compile(r'"t":\s*"([A-Z_]+)"')
+WORD = re.compile(r"\w+")
+
+
+class Anonymiser:
+    """Consistently replace IDs, names and words in gateway payloads.
+
+    The mapping is keyed with a secret that's never stored, so it can't be
+    reversed from a recording. Snowflakes keep their timestamp bits, since
+    message ages matter to moderation, and the same word always maps to the
+    same scrambled word of equal length, so reposts still look alike. Words
+    in `keep` (tag names, codes, article titles) are left as they are so
+    tag lookups behave the same on replay.
+    """
+
+    def __init__(self, keep: set = frozenset()):
+        self.secret = secrets.token_bytes(32)
+        self.keep = keep
+
+    def digest(self, value: str):
+        return hmac.new(self.secret, value.encode(), hashlib.sha256).digest()
+
+    def snowflake(self, value: str):
+        bits = int.from_bytes(self.digest(value)[:4], "big") & 0x3FFFFF
+        return str(int(value) >> 22 << 22 | bits)
+
+    def word(self, match: re.Match):
+        word = match.group()
+        if SNOWFLAKE.fullmatch(word):
+            return self.snowflake(word)
+        if word.lower() in self.keep or (word.isdigit() and len(word) < 8):
+            return word
+
+        letters = string.digits if word.isdigit() else string.ascii_lowercase
+        return "".join(
+            letters[byte % len(letters)]
+            for byte in self.digest(word.lower())[:len(word)])
+
+    def text(self, text: str):
+        return WORD.sub(self.word, text)
+
+    def payload(self, data):
+        """A copy of a gateway payload with identifying details replaced."""
+        if isinstance(data, dict):
+            anonymised = {}
+            for key, value in data.items():
+                if key in BLANKED_KEYS:
+                    anonymised[key] = [] if isinstance(value, list) else None
+                    continue
+                if SNOWFLAKE.fullmatch(key):  # e.g. resolved users by ID
+                    key = self.snowflake(key)
+
+                if key == "token":
+                    value = "replay"
+                elif key in NAME_KEYS and isinstance(value, str):
+                    value = "user" + self.digest(value)[:4].hex()
+                elif key in TEXT_KEYS and isinstance(value, str):
+                    value = self.text(value)
+                else:
+                    value = self.payload(value)
+                anonymised[key] = value
+            return anonymised
+
+        if isinstance(data, list):
+            return [self.payload(value) for value in data]
+        if isinstance(data, str) and SNOWFLAKE.fullmatch(data):
+            return self.snowflake(data)
+        return data
+
+
+def recorded_dispatch(raw: str):
+    """The event name and data of a raw gateway message worth recording.
+
+    Returns None for anything else. Every gateway message goes through
+    here, so the event name is looked for in the text first, and only the
+    recorded events are decoded a second time.
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+
+    match = EVENT_NAME.search(raw)
+    if not match or match.group(1) not in RECORDED_EVENTS:
+        return None
+
+    message = json.loads(raw)
+    if message.get("op") != 0 or message.get("t") not in RECORDED_EVENTS:
+        return None
+    return message["t"], message["d"]
+
+
+class RecordingWriter:
+    """Gzipped JSON lines of `[milliseconds since start, event, data]`.
+
+    The first line is a `RECORDING` pseudo-event holding the Unix time the
+    recording started at, in milliseconds.
+    """
+
+    def __init__(self, path: str, anonymiser: Anonymiser):
+        self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self.anonymiser = anonymiser
+        self.started = time.monotonic()
+        self.count = 0
+        self.write_line(0, "RECORDING", {"started": round(time.time() * 1000)})
+
+    def write(self, event: str, data: dict):
+        offset = round((time.monotonic() - self.started) * 1000)
+        self.write_line(offset, event, self.anonymiser.payload(data))
+        self.count += 1
+
+    def write_line(self, offset: int, event: str, data: dict):
+        self.file.write(
+            json.dumps([offset, event, data], separators=(",", ":")) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def shift_snowflakes(data, milliseconds: int):
+    """A copy of a payload with every snowflake's time moved forward."""
+    if isinstance(data, dict):
+        return {
+            shift_snowflakes(key, milliseconds):
+                shift_snowflakes(value, milliseconds)
+            for key, value in data.items()}
+    if isinstance(data, list):
+        return [shift_snowflakes(value, milliseconds) for value in data]
+    if isinstance(data, str):
+        return SNOWFLAKE.sub(
+            lambda match: str(int(match.group()) + (milliseconds << 22)),
+            data)
+    return data
+
+
+def read_recording(path: str):
+    """Every `(milliseconds, event, data)` dispatch in a recording."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [tuple(json.loads(line)) for line in file if line.strip()]
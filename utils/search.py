@@ -0,0 +1,117 @@
+import math
+import re
+
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can do does for from get got has have how "
+    "i i'm if in into is it it's its me my no not of on or so that the this "
+    "to was what when where which who why will with you your".split())
+K1 = 1.2  # BM25 term frequency saturation
+B = 0.75  # BM25 length normalisation
+
+
+def stem(word: str):
+    """Fold simple plurals, so "vpn" finds "VPNs"."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str):
+    """Lowercase words of a text, without stop words or single letters."""
+    return [
+        stem(word) for word in WORD.findall(text.lower())
+        if len(word) > 1 and word not in STOP_WORDS]
+
+
+class ArticleSearch:
+    """Inverted index over article titles, ranked with BM25.
+
+    Only the posting lists of words in the query are visited, so search
+    time depends on the query rather than on how many articles there are.
+    A long message mentions many words, so an article only counts as found
+    when most of its title is in the query, or most of a short query is in
+    its title.
+    """
+
+    def __init__(self, *, title_coverage=0.6, query_coverage=0.75):
+        self.title_coverage = title_coverage
+        self.query_coverage = query_coverage
+        self.postings = {}  # term: {title: count}
+        self.documents = {}  # title: terms
+        self.total_length = 0
+        self.idfs = {}  # cached until the next change
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, title: str):
+        if title in self.documents:
+            return
+
+        document = terms(title)
+        self.idfs.clear()
+        self.documents[title] = document
+        self.total_length += len(document)
+        for term in document:
+            postings = self.postings.setdefault(term, {})
+            postings[title] = postings.get(title, 0) + 1
+
+    def remove(self, title: str):
+        document = self.documents.pop(title, None)
+        if document is None:
+            return
+
+        self.idfs.clear()
+        self.total_length -= len(document)
+        for term in set(document):
+            postings = self.postings[term]
+            del postings[title]
+            if not postings:
+                del self.postings[term]
+
+    def idf(self, term: str):
+        idf = self.idfs.get(term)
+        if idf is None:
+            frequency = len(self.postings.get(term, ()))
+            idf = math.log(
+                1 + (len(self.documents) - frequency + 0.5)
+                / (frequency + 0.5))
+            if frequency:  # any word can be queried, keep the cache bounded
+                self.idfs[term] = idf
+        return idf
+
+    def search(self, query: str, limit: int = 3):
+        """Get the titles matching the query best, best first."""
+        query_terms = set(terms(query))
+        known_terms = [term for term in query_terms if term in self.postings]
+        if not known_terms:
+            return []
+
+        average_length = self.total_length / len(self.documents) or 1
+        scores = {}
+        matched = {}
+
+        for term in known_terms:
+            idf = self.idf(term)
+            for title, count in self.postings[term].items():
+                length = len(self.documents[title])
+                scores[title] = scores.get(title, 0) + idf * (
+                    count * (K1 + 1)
+                    / (count + K1 * (1 - B + B * length / average_length)))
+                matched[title] = matched.get(title, 0) + idf
+
+        short_query = len(query_terms) <= 4
+        query_weight = sum(map(self.idf, query_terms))
+
+        found = []
+        for title in sorted(scores, key=scores.get, reverse=True):
+            title_weight = sum(map(self.idf, set(self.documents[title])))
+            if (matched[title] >= self.title_coverage * title_weight
+                    or short_query and matched[title]
+                    >= self.query_coverage * query_weight):
+                found.append(title)
+                if len(found) == limit:
+                    break
+
+        return found
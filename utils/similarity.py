@@ -0,0 +1,90 @@
+from difflib import SequenceMatcher
+from collections import Counter
+
+
+SHINGLE_SIZE = 3
+
+
+class Fingerprint:
+    """Text along with the counts used to bound its similarity, made lazily."""
+
+    __slots__ = ("text", "_counts", "_shingles")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._counts = None
+        self._shingles = None
+
+    @property
+    def counts(self):
+        if self._counts is None:
+            self._counts = Counter(self.text)
+        return self._counts
+
+    @property
+    def shingles(self):
+        if self._shingles is None:
+            text = self.text
+            self._shingles = frozenset(map("".join, zip(
+                *(text[i:] for i in range(SHINGLE_SIZE)))))
+        return self._shingles
+
+
+class SimilarityEngine:
+    """Decide whether two texts have a `SequenceMatcher` ratio above a limit.
+
+    The exact ratio is quadratic in the worst case, so cheap upper bounds of
+    it rule out most pairs first: the length bound that `real_quick_ratio`
+    uses, the character overlap bound that `quick_ratio` uses, then a bound
+    from shared shingles (see `shingle_bound`). All of them are proper upper
+    bounds, so decisions never differ from computing the ratio directly.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+
+    def fingerprint(self, text: str):
+        return Fingerprint(text)
+
+    @staticmethod
+    def shingle_bound(a: Fingerprint, b: Fingerprint, length: int):
+        """Upper bound of the characters in matching blocks of two texts.
+
+        A block of k matched characters shares k - q + 1 shingles of size q,
+        so the M matched characters in B blocks share at least M - (q-1)B
+        shingles. Blocks are never adjacent in both texts, so B - 1 is at
+        most the unmatched characters, length - 2M. Together with the shared
+        shingle count C, that gives M <= (C + (q-1)(length+1)) / (2q-1).
+
+        C is bounded in turn by the shingles of either text less one for
+        each distinct shingle the other lacks, which only takes set
+        differences rather than counting every shingle.
+        """
+        q = SHINGLE_SIZE
+        shared = min(
+            max(len(a.text) - q + 1, 0) - len(a.shingles - b.shingles),
+            max(len(b.text) - q + 1, 0) - len(b.shingles - a.shingles))
+        return (shared + (q - 1) * (length + 1)) / (2 * q - 1)
+
+    def is_similar(self, a, b):
+        """Whether the ratio between two texts or fingerprints is too high."""
+        if isinstance(a, str):
+            a = self.fingerprint(a)
+        if isinstance(b, str):
+            b = self.fingerprint(b)
+
+        length = len(a.text) + len(b.text)
+        if not length:
+            return 1.0 > self.threshold
+
+        if 2.0 * min(len(a.text), len(b.text)) / length <= self.threshold:
+            return False
+
+        overlap = sum((a.counts & b.counts).values())
+        if 2.0 * overlap / length <= self.threshold:
+            return False
+
+        if 2.0 * self.shingle_bound(a, b, length) / length <= self.threshold:
+            return False
+
+        return SequenceMatcher(None, a.text, b.text).ratio() > self.threshold
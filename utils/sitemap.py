@@ -0,0 +1,60 @@
+import xml.etree.ElementTree as ET
+
+
+NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+HOME_URL = "https://support.parsec.app/hc/en-us"
+
+
+def article_from_loc(loc: str):
+    """Get the article title and short URL from a sitemap location."""
+    if "-" not in loc:
+        return None
+
+    url, title = loc.replace("/en-us/", "/").split("-", 1)
+    title = title.replace("-", " ")
+    title = title.replace(" t ", "'t ")  # e.g. Don t -> Don't
+    title = title.replace(" re ", "'re ")  # e.g. You re -> You're
+
+    return title, url
+
+
+class SitemapParser:
+    """Incremental sitemap parser, fed with chunks of the response body.
+
+    Each `<url>` element is dropped from the tree once its `<loc>` is read,
+    so memory use stays flat no matter how large the sitemap gets.
+    """
+
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=("start", "end"))
+        self.root = None
+        self.depth = 0
+        self.locs = {}  # used as an ordered set
+
+    def feed(self, chunk: bytes):
+        self.parser.feed(chunk)
+        self.collect()
+
+    def close(self):
+        """Finish parsing and get every article location, in order."""
+        self.parser.close()
+        self.collect()
+        return list(self.locs)
+
+    def collect(self):
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if not self.depth:
+                    self.root = element
+                self.depth += 1
+                continue
+
+            self.depth -= 1
+            if self.depth != 1 or element.tag != f"{NAMESPACE}url":
+                continue
+
+            for loc in element.findall(f"{NAMESPACE}loc"):
+                if loc.text and loc.text != HOME_URL:
+                    self.locs[loc.text] = None
+
+            self.root.clear()
@@ -0,0 +1,27 @@
+import logging
+import pickle
+import os
+
+
+def save_snapshot(path: str, data):
+    """Pickle data to a file, replacing the old one only once it's written.
+
+    Meant to run in a worker thread. A crash halfway leaves the previous
+    snapshot in place rather than a truncated one.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path: str):
+    """Unpickle a snapshot, or get None if there's no usable one."""
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.exception(f"Ignoring unreadable snapshot {path}")
+        return None
@@ -0,0 +1,119 @@
+import sqlite3
+import pickle
+import json
+import os
+
+
+class TagStore:
+    """SQLite storage for custom tags, written one tag at a time.
+
+    The database runs in WAL mode, so each edit only appends a small record
+    to the write-ahead log, and several processes can share it safely.
+    Folding the log back into the database and taking a backup snapshot is
+    left to `compact`, which opens its own connection and is meant to run
+    in a worker thread.
+
+    Tags belong to a guild, or to every guild with a guild ID of 0, and are
+    indexed by guild so loading one guild's tags doesn't read the others.
+    """
+
+    def __init__(self, path: str = "db.sqlite", legacy_path: str = "db.p"):
+        self.path = path
+        self.dirty = False
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        # Checking and migrating under the write lock makes workers starting
+        # together migrate one at a time, the later ones finding it done
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            columns = [
+                row[1] for row in
+                self.connection.execute("PRAGMA table_info(tags)")]
+
+            if not columns:
+                self.migrate(legacy_path)
+            elif "guild_id" not in columns:
+                self.add_guild_ids()
+
+    def migrate(self, legacy_path: str):
+        """Create the table, importing the old pickle database if any.
+
+        The pickle is left in place, and tags already imported are skipped,
+        so importing it again is harmless.
+        """
+        try:
+            with open(legacy_path, "rb") as file:
+                db = pickle.load(file)
+        except FileNotFoundError:
+            db = {}
+
+        self.create_table("tags")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tags (name, content, aliases) "
+            "VALUES (?, ?, ?)",
+            [
+                (name, value["content"], json.dumps(value["aliases"]))
+                for name, value in db.items()])
+
+    def add_guild_ids(self):
+        """Move tags made before guilds had their own to the global ones."""
+        self.create_table("guild_tags")
+        self.connection.execute(
+            "INSERT INTO guild_tags (id, name, content, aliases) "
+            "SELECT id, name, content, aliases FROM tags")
+        self.connection.execute("DROP TABLE tags")
+        self.connection.execute("ALTER TABLE guild_tags RENAME TO tags")
+
+    def create_table(self, name: str):
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} ("
+            "id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL DEFAULT 0, "
+            "name TEXT NOT NULL, content TEXT NOT NULL, "
+            "aliases TEXT NOT NULL, UNIQUE (guild_id, name))")
+
+    def load(self, guild_id: int = 0):
+        """Get every tag of a guild, in the order they were created."""
+        rows = self.connection.execute(
+            "SELECT name, content, aliases FROM tags WHERE guild_id = ? "
+            "ORDER BY id", (guild_id,))
+
+        return {
+            name: {"content": content, "aliases": json.loads(aliases)}
+            for name, content, aliases in rows}
+
+    def put(self, name: str, content: str, aliases: list, guild_id: int = 0):
+        """Create a tag, or update it in place if it exists."""
+        self.connection.execute(
+            "INSERT INTO tags (guild_id, name, content, aliases) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (guild_id, name) DO UPDATE "
+            "SET content = excluded.content, aliases = excluded.aliases",
+            (guild_id, name, content, json.dumps(aliases)))
+        self.dirty = True
+
+    def delete(self, name: str, guild_id: int = 0):
+        """Delete a tag if it exists."""
+        self.connection.execute(
+            "DELETE FROM tags WHERE guild_id = ? AND name = ?",
+            (guild_id, name))
+        self.dirty = True
+
+    def compact(self):
+        """Checkpoint the log into the database and snapshot it atomically."""
+        self.dirty = False
+        temporary_path = f"{self.path}.bak.{os.getpid()}.tmp"
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            with sqlite3.connect(temporary_path) as backup:
+                connection.backup(backup)
+            backup.close()
+        finally:
+            connection.close()
+
+        os.replace(temporary_path, f"{self.path}.bak")
+
+    def close(self):
+        self.connection.close()
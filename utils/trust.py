@@ -0,0 +1,78 @@
+import discord
+
+TRUSTED_ROLES = ("Hero", "Jedi", "Parsec Team")
+USERS_WITH_EDIT_PERMISSION = (
+    124207277174423552,  # Kodikuu
+    141336932213981184,  # Skippy
+    289887222310764545)  # Borgo
+
+
+class TrustClassifier:
+    """Who is trusted, the owner or a tag editor, shared by every cog.
+
+    Trusted role names are resolved once per guild into a set of role IDs,
+    so checking a member is a dict lookup and a search of its role IDs for
+    each of the few trusted ones, without building anything. Role events
+    drop a guild's role IDs, to be resolved again when next needed.
+    """
+
+    def __init__(self, bot, trusted_roles=TRUSTED_ROLES):
+        self.bot = bot
+        self.trusted_roles = frozenset(trusted_roles)
+        self.role_ids = {}  # guild ID: trusted role IDs
+
+        for listener in (
+                self.on_guild_role_create, self.on_guild_role_delete,
+                self.on_guild_role_update, self.on_guild_remove):
+            bot.add_listener(listener)
+
+    def is_owner(self, user: discord.abc.User):
+        """Whether the user owns the bot, never before that's known."""
+        owner = self.bot.owner
+        return owner is not None and user.id == owner.id
+
+    def is_tag_editor(self, user: discord.abc.User):
+        """Whether the user may edit global tags."""
+        return self.is_owner(user) or user.id in USERS_WITH_EDIT_PERMISSION
+
+    def is_trusted(self, member: discord.abc.User):
+        """Whether a member is the bot or has a trusted role.
+
+        Role IDs come with every member payload, so this is always current.
+        Users that aren't members of the guild, such as mentions of people
+        who left, are never trusted.
+        """
+        if member.id == self.bot.user.id:
+            return True
+
+        guild = getattr(member, "guild", None)
+        if guild is None:
+            return False
+        return any(
+            member.get_role(role_id)
+            for role_id in self.trusted_role_ids(guild))
+
+    def trusted_role_ids(self, guild: discord.Guild):
+        role_ids = self.role_ids.get(guild.id)
+        if role_ids is None:
+            role_ids = self.role_ids[guild.id] = frozenset(
+                role.id for role in guild.roles
+                if role.name in self.trusted_roles)
+        return role_ids
+
+    def forget_guild(self, guild: discord.Guild):
+        self.role_ids.pop(guild.id, None)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        self.forget_guild(role.guild)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.forget_guild(role.guild)
+
+    async def on_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ):
+        self.forget_guild(after.guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.forget_guild(guild)